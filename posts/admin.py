@@ -1,12 +1,34 @@
 from django.contrib import admin
 
+from . import search
 from .models import Group, Post, Comment
+from .paginators import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class FullTextSearchMixin:
+    '''Поиск в админке по индексу FTS5 (см. posts.search) вместо
+    LIKE '%q%' по всей таблице. search_fields нужны только для того,
+    чтобы админка показала поле поиска.'''
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.available():
+            return super().get_search_results(
+                request, queryset, search_term)
+        return queryset.filter(
+            pk__in=search.matching_ids(self.model, search_term)), False
+
+
+class LargeTableAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    '''Список без полного COUNT(*) и с поиском по индексу.'''
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author')
+    list_select_related = ('author',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    autocomplete_fields = ('author', 'group')
     empty_value_display = '-пусто-'
 
 
@@ -17,10 +39,14 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('pk', 'post', 'text', 'author')
-    search_fields = ('author',)
-    list_filter = ('author',)
+    list_select_related = ('post', 'author')
+    search_fields = ('text',)
+    # Фильтр по автору перечислял бы всех пользователей на каждой странице.
+    list_filter = ('created',)
+    raw_id_fields = ('post',)
+    autocomplete_fields = ('author',)
     empty_value_display = '-пусто-'
 
 
@@ -1,9 +1,22 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
 
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(install_search, sender=self)
+
+
+def install_search(using, **kwargs):
+    # Пересоздание таблицы в миграции SQLite удаляет её триггеры поиска.
+    from django.db import connections
+
+    from .search import install
+    install(connections[using])
+
 
 class GroupConfig(AppConfig):
     name = 'group'
@@ -0,0 +1,236 @@
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.safestring import mark_safe
+
+from yatube import timing
+
+from .models import Group
+
+POST_CARD_TEMPLATE = 'includes/post_item.html'
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+# Страницы живут долго: актуальность обеспечивают поколения, а не TTL.
+FEED_PAGE_TIMEOUT = 60 * 60
+FEED = 'feed'
+# Любая группа: её название и адрес видны в карточках постов всех лент.
+GROUPS = 'groups'
+FOLLOW_PAGES_PER_USER = 5
+GROUP_CACHE_SIZE = 256
+
+card_stats = Counter()
+_groups = OrderedDict()
+_groups_lock = threading.Lock()
+
+
+def post_card_key(post, is_author):
+    '''Ключ карточки меняется вместе с версией поста, его группы и именем
+    автора, которое стоит в ссылках карточки, поэтому инвалидировать ничего
+    не нужно: устаревшие записи вытеснит кэш.'''
+    group = post.group if post.group_id else None
+    group_part = f'{group.pk}.{group.version}' if group else '-'
+    return (f'post_card:{post.pk}:{post.version}:{group_part}:'
+            f'{post.author.username}:{int(is_author)}')
+
+
+def render_post_card(context, post):
+    user = context.get('user')
+    is_author = getattr(user, 'pk', None) == post.author_id
+    key = post_card_key(post, is_author)
+    html = cache.get(key)
+    if html is not None:
+        card_stats['hits'] += 1
+        timing.incr('cache_hits')
+        return mark_safe(html)
+    card_stats['misses'] += 1
+    timing.incr('cache_misses')
+    template = context.template.engine.get_template(POST_CARD_TEMPLATE)
+    with context.push(post=post) as card:
+        html = template.render(context)
+    # Карточку с запасной картинкой не кэшируем: миниатюра вот-вот будет.
+    if not card.get('thumbnail_pending'):
+        cache.set(key, html, POST_CARD_TIMEOUT)
+    return mark_safe(html)
+
+
+def card_cache_stats():
+    '''Попадания и промахи кэша карточек в этом процессе.'''
+    hits, misses = card_stats['hits'], card_stats['misses']
+    total = hits + misses
+    return {'hits': hits, 'misses': misses,
+            'hit_ratio': hits / total if total else 0.0}
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def _generation_key(scope):
+    return f'generation:{scope}'
+
+
+def _fresh_generation():
+    # Поколение, потерянное при вытеснении из кэша, начинается заново со
+    # значения, которого заведомо не было раньше.
+    return int(time.time() * 1000)
+
+
+def get_generations(*scopes):
+    '''Текущие поколения областей одним обращением к кэшу.'''
+    keys = [_generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _fresh_generation(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_generation(), None)
+
+
+def bump_generations(*scopes):
+    '''Делает недействительным всё, что закэшировано для этих областей.
+
+    Поколение сдвигается сразу и ещё раз после коммита: иначе страница,
+    собранная параллельным запросом до коммита, осталась бы в кэше под
+    новым поколением со старыми данными.
+    '''
+    _bump(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def bump_post_generations(author_id, *group_ids):
+    '''Сдвигает поколения всех лент, в которых виден пост автора.'''
+    scopes = [FEED, author_scope(author_id)]
+    scopes.extend(group_scope(pk) for pk in set(group_ids) if pk)
+    bump_generations(*scopes)
+
+
+class CachedCount:
+    '''Обёртка над лентой для Paginator: count() читается из кэша под
+    ключом из областей ленты и их поколений, поэтому COUNT(*) выполняется
+    один раз на поколение, а не на каждой странице.'''
+
+    def __init__(self, object_list, scopes, timeout=FEED_PAGE_TIMEOUT):
+        self.object_list = object_list
+        self.scopes = scopes
+        self.timeout = timeout
+
+    def count(self):
+        raw = '|'.join(map(str, [*self.scopes,
+                                 *get_generations(*self.scopes)]))
+        key = 'feed_count:' + hashlib.md5(raw.encode()).hexdigest()
+        count = cache.get(key)
+        timing.incr('cache_misses' if count is None else 'cache_hits')
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, self.timeout)
+        return count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+def get_group(slug):
+    '''Group по slug из LRU этого процесса или None.
+
+    Запись хранит поколение группы на момент чтения: правка или удаление
+    группы в любом процессе сдвигает поколение, и устаревшая запись
+    перечитывается из базы. Проверка — одно чтение из общего кэша.
+    '''
+    with _groups_lock:
+        entry = _groups.get(slug)
+        if entry is not None:
+            _groups.move_to_end(slug)
+    if entry is not None:
+        group, generation = entry
+        if get_generations(group_scope(group.pk)) == [generation]:
+            return group
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return None
+    generation, = get_generations(group_scope(group.pk))
+    with _groups_lock:
+        _groups[slug] = (group, generation)
+        _groups.move_to_end(slug)
+        while len(_groups) > GROUP_CACHE_SIZE:
+            _groups.popitem(last=False)
+    return group
+
+
+def forget_group(group_id):
+    '''Убирает группу из LRU этого процесса.'''
+    with _groups_lock:
+        for slug in [slug for slug, (group, _) in _groups.items()
+                     if group.pk == group_id]:
+            del _groups[slug]
+
+
+def _remember_key(ring_key, key, limit):
+    # Кольцо последних ключей пользователя: всё, что старше limit,
+    # удаляется, поэтому личные страницы не разрастаются в кэше.
+    keys = [k for k in cache.get(ring_key, []) if k != key] + [key]
+    if len(keys) > limit:
+        cache.delete_many(keys[:-limit])
+        keys = keys[-limit:]
+    cache.set(ring_key, keys, None)
+
+
+def cache_by_generation(get_scopes, timeout=FEED_PAGE_TIMEOUT,
+                        per_user_limit=None):
+    '''Кэширует ответ GET-представления под ключом из URL, пользователя и
+    поколений областей, которые вернула get_scopes(request, **kwargs).
+
+    В отличие от cache_page запись в любую из областей сразу делает
+    закэшированную страницу недоступной. per_user_limit ограничивает
+    число страниц, которые хранятся для одного пользователя.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            scopes = get_scopes(request, **kwargs)
+            generations = get_generations(*scopes)
+            raw = '|'.join(map(str, [request.get_full_path(),
+                                     request.user.pk, *scopes,
+                                     *generations]))
+            key = 'page:' + hashlib.md5(raw.encode()).hexdigest()
+            response = cache.get(key)
+            timing.incr('cache_misses' if response is None
+                        else 'cache_hits')
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.cookies:
+                cache.set(key, response, timeout)
+                if per_user_limit and request.user.pk is not None:
+                    _remember_key(f'page_ring:{view.__name__}:'
+                                  f'{request.user.pk}', key, per_user_limit)
+            return response
+        return wrapper
+    return decorator
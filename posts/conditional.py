@@ -0,0 +1,63 @@
+'''Валидаторы для условных GET-запросов.
+
+ETag собирается из поколений кэша (см. posts.cache), пользователя и URL
+и считается без рендеринга шаблонов: поколения читаются из кэша.
+
+Last-Modified не отдаётся: дата последнего поста не меняется при правке
+или удалении поста, переименовании группы и подписках, а Django
+проверяет If-Modified-Since всякий раз, когда нет If-None-Match, и
+клиенты, сверяющиеся по дате, получали бы 304 на устаревшую страницу.
+Поколения сдвигаются при всех этих изменениях.
+'''
+import hashlib
+
+from django.views.decorators.http import condition
+
+from .cache import (FEED, GROUPS, author_scope, get_generations, get_group,
+                    group_scope)
+from .models import User
+
+
+def _etag(request, scopes):
+    parts = [request.resolver_match.url_name, request.get_full_path(),
+             request.user.pk, *scopes, *get_generations(*scopes)]
+    return hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+def _user_id(username):
+    return User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+
+
+def _group_id(slug):
+    group = get_group(slug)
+    return group.pk if group else None
+
+
+def index_etag(request):
+    return _etag(request, [FEED])
+
+
+def group_etag(request, slug):
+    group_id = _group_id(slug)
+    return _etag(request, [group_scope(group_id)]) if group_id else None
+
+
+def profile_etag(request, username):
+    # Карточки постов профиля показывают название и адрес группы, а правка
+    # группы не трогает поколение автора.
+    user_id = _user_id(username)
+    if user_id is None:
+        return None
+    return _etag(request, [author_scope(user_id), GROUPS])
+
+
+def post_etag(request, username, post_id):
+    user_id = _user_id(username)
+    return _etag(request, [author_scope(user_id)]) if user_id else None
+
+
+index_condition = condition(etag_func=index_etag)
+group_condition = condition(etag_func=group_etag)
+profile_condition = condition(etag_func=profile_etag)
+post_condition = condition(etag_func=post_etag)
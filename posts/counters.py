@@ -0,0 +1,74 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def _change(model, pk, **deltas):
+    '''Атомарно сдвигает счётчики строки через UPDATE ... SET x = x + d,
+    не читая значение в Python. Возвращает число изменённых строк.'''
+    changes = {name: Greatest(F(name) + delta, 0)
+               for name, delta in deltas.items()}
+    return model.objects.filter(pk=pk).update(**changes)
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by().values(field)
+        .annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def recount_posts(posts=None):
+    '''Пересчитывает Post.comments_count одним UPDATE.'''
+    if posts is None:
+        posts = Post.objects.all()
+    return posts.update(comments_count=_count(Comment.objects, 'post'))
+
+
+def recount_user_stats(users=None):
+    '''Создаёт недостающие UserStats и пересчитывает их одним UPDATE.'''
+    if users is None:
+        users = User.objects.all()
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in users.filter(
+            stats__isnull=True).values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    return UserStats.objects.filter(user__in=users).update(
+        posts_count=_count(Post.objects, 'author'),
+        followers_count=_count(Follow.objects, 'author'),
+        following_count=_count(Follow.objects, 'user'),
+    )
+
+
+def change_user_stats(user_id, **deltas):
+    if user_id is None:
+        return
+    if _change(UserStats, user_id, **deltas):
+        return
+    # Строки нет. При уменьшении это значит, что пользователя удаляют
+    # каскадом: UserStats ушла раньше его постов, и пересчёт вставил бы
+    # строку, ссылающуюся на удалённого пользователя.
+    if any(delta < 0 for delta in deltas.values()):
+        return
+    # Иначе строки ещё не было: изменение уже записано, поэтому
+    # достаточно посчитать значения с нуля.
+    recount_user_stats(User.objects.filter(pk=user_id))
+
+
+def post_added(post, delta=1):
+    change_user_stats(post.author_id, posts_count=delta)
+
+
+def comment_added(comment, delta=1):
+    # Число комментариев видно в карточке поста, поэтому версия растёт.
+    if comment.post_id is not None:
+        _change(Post, comment.post_id, comments_count=delta, version=1)
+
+
+def follow_added(follow, delta=1):
+    change_user_stats(follow.author_id, followers_count=delta)
+    change_user_stats(follow.user_id, following_count=delta)
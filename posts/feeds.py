@@ -0,0 +1,213 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+
+from .cache import author_scope, bump_generations
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginators import FEED_ORDERING, cursor_values, seek
+
+# Порядок строк ленты совпадает с индексом timeline_user_date_idx. Именно
+# post_id: '-post' Django развернул бы в порядок Post по join, и SQLite
+# досортировывал бы строки во временном B-дереве.
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+
+BACKFILL_BATCH_SIZE = 500
+
+# Номерная страница ленты со «знаменитостями» сливает источники с самого
+# начала, поэтому номерами листаются только первые MERGED_FEED_DEPTH
+# постов; дальше лента идёт по курсору.
+MERGED_FEED_DEPTH = 1000
+
+
+def _bulk_insert(entries):
+    # bulk_create сам превращает генератор в список, поэтому режем его на
+    # пачки, чтобы бэкфилл плодовитого автора не держал всё в памяти.
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BACKFILL_BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def is_celebrity(author_id):
+    '''Посты «знаменитостей» не раскладываются, а подтягиваются при чтении.'''
+    return UserStats.objects.filter(user_id=author_id,
+                                    feed_pulled=True).exists()
+
+
+def followed_celebrities(user):
+    return list(Follow.objects.filter(
+        user=user, author__stats__feed_pulled=True,
+    ).values_list('author_id', flat=True))
+
+
+def fan_out_post(post):
+    '''Раскладывает новый пост в ленты всех подписчиков автора.'''
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id, user__isnull=False
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def _backfill(user_ids, author_id, limit=None):
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        *FEED_ORDERING).values_list('pk', 'pub_date')
+    if limit is not None:
+        posts = posts[:limit]
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=pk, author_id=author_id,
+                      pub_date=pub_date)
+        for pk, pub_date in posts.iterator()
+        for user_id in user_ids
+    )
+
+
+def backfill_followers(author_id, limit=None):
+    '''Раскладывает последние limit постов автора (все, если limit не
+    задан) по лентам всех его подписчиков.'''
+    followers = Follow.objects.filter(
+        author_id=author_id, user__isnull=False
+    ).values_list('user_id', flat=True)
+    _backfill(list(followers), author_id, limit)
+
+
+def wanted_mode(followers_count, pulled):
+    '''Режим автора с гистерезисом: в pull — с FEED_PULL_THRESHOLD
+    подписчиков, обратно в push — только ниже FEED_PUSH_THRESHOLD.'''
+    if followers_count >= settings.FEED_PULL_THRESHOLD:
+        return True
+    if followers_count < settings.FEED_PUSH_THRESHOLD:
+        return False
+    return pulled
+
+
+def switch_mode(author_id, pulled, backfill_limit=None):
+    '''Переключает режим автора. Условный UPDATE не даёт двум
+    параллельным запросам переключить его дважды. Возвращает True, если
+    режим изменился.
+
+    При возврате в push в ленты раскладываются только последние
+    backfill_limit постов: у подписчиков, подписавшихся, пока автор был в
+    pull, более старых постов в ленте не будет до rebuild_timelines.'''
+    changed = UserStats.objects.filter(
+        user_id=author_id, feed_pulled=not pulled,
+    ).update(feed_pulled=pulled)
+    if not changed:
+        return False
+    if not pulled:
+        # Посты, вышедшие, пока автор был в pull, есть только в Post.
+        backfill_followers(author_id, backfill_limit)
+    # Ленты подписок берут посты автора теперь из другого источника, а
+    # переключение из rebuild_timelines не сопровождается подпиской.
+    bump_generations(author_scope(author_id))
+    return True
+
+
+def update_mode(author_id):
+    '''Пересматривает режим автора после изменения числа подписчиков и
+    возвращает, в pull ли он.'''
+    stats = UserStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', 'feed_pulled').first()
+    if stats is None:
+        return False
+    followers_count, pulled = stats
+    wanted = wanted_mode(followers_count, pulled)
+    if wanted != pulled:
+        # Раскладка ограничена последними постами, чтобы чужой запрос на
+        # отписку не копировал всю историю автора в сотни лент.
+        switch_mode(author_id, wanted, settings.FEED_BACKFILL_POSTS)
+    return wanted
+
+
+def backfill(user_id, author_id):
+    '''Добавляет в ленту пользователя последние FEED_BACKFILL_POSTS постов
+    автора после подписки. Подписка идёт в запросе пользователя, поэтому
+    всю историю плодовитого автора сюда не копируем; её раскладывает
+    rebuild_timelines.'''
+    if not update_mode(author_id):
+        _backfill([user_id], author_id, settings.FEED_BACKFILL_POSTS)
+
+
+def purge(user_id, author_id):
+    '''Убирает посты автора из ленты пользователя после отписки.'''
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+    update_mode(author_id)
+
+
+def _merge(sources, reverse, limit):
+    # Источники уже отсортированы по ключу ленты, поэтому достаточно
+    # слить их, не пересортировывая всё целиком.
+    merged = heapq.merge(*sources, key=cursor_values, reverse=not reverse)
+    return list(islice(merged, limit))
+
+
+class FollowFeed:
+    '''Лента подписок пользователя.
+
+    Посты обычных авторов читаются из TimelineEntry (push), посты
+    «знаменитостей» — напрямую из Post по индексу автора (pull); при
+    чтении оба источника сливаются по (pub_date, id). Поддерживает
+    count() и срезы для Paginator и seek() для CursorPaginator.
+
+    Без «знаменитостей» срез — обычный OFFSET по TimelineEntry. Со
+    слиянием count() не больше max_depth: глубже номерные страницы
+    читали бы из каждого источника все посты до нужной страницы.
+    '''
+
+    def __init__(self, user):
+        self.celebrities = followed_celebrities(user)
+        self.entries = TimelineEntry.objects.filter(user=user)
+        self.pulled = self.max_depth = None
+        if self.celebrities:
+            self.max_depth = MERGED_FEED_DEPTH
+            self.entries = self.entries.exclude(
+                author_id__in=self.celebrities)
+            self.pulled = Post.objects.filter(author_id__in=self.celebrities)
+
+    def _feed_entries(self):
+        return self.entries.select_related('post__author', 'post__group')
+
+    def _pulled_by_author(self):
+        # По запросу на автора: каждый читает готовый отрезок индекса
+        # (author, pub_date), а author_id IN (...) заставил бы SQLite
+        # сортировать все посты этих авторов во временном B-дереве.
+        return [Post.objects.for_feed().filter(author_id=author_id)
+                for author_id in self.celebrities]
+
+    def count(self):
+        count = self.entries.count()
+        if self.pulled is not None:
+            count = min(count + self.pulled.count(), self.max_depth)
+        return count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        entries = self._feed_entries().order_by(*TIMELINE_ORDERING)
+        if self.pulled is None:
+            return [entry.post for entry in entries[start:stop]]
+        stop = min(stop, self.max_depth)
+        sources = [[entry.post for entry in entries[:stop]]]
+        sources.extend(posts.order_by(*FEED_ORDERING)[:stop]
+                       for posts in self._pulled_by_author())
+        return _merge(sources, False, stop)[start:]
+
+    def seek(self, values, reverse, limit):
+        entries = seek(self._feed_entries(), TIMELINE_ORDERING, values,
+                       reverse, limit)
+        sources = [[entry.post for entry in entries]]
+        sources.extend(seek(posts, FEED_ORDERING, values, reverse, limit)
+                       for posts in self._pulled_by_author())
+        return _merge(sources, reverse, limit)
@@ -0,0 +1,100 @@
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from PIL import Image
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.engines import pil_engine
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.parsers import parse_geometry
+
+from posts.thumbnails import POST_THUMBNAILS
+
+DEFAULT_ENGINE = 'posts.management.commands.benchmark_thumbnails.StockEngine'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+class StockEngine(pil_engine.Engine):
+    '''Стандартный движок sorl как точка отсчёта: без draft и
+    reducing_gap. Сам он ресайзит через Image.ANTIALIAS, которого в
+    Pillow 10+ нет; LANCZOS — тот же фильтр под новым именем.'''
+
+    def _scale(self, image, width, height):
+        return image.resize((width, height), resample=Image.LANCZOS)
+
+
+def _options(source, options):
+    # Те же умолчания, что подставляет sorl при построении миниатюры.
+    backend = ThumbnailBackend()
+    options = dict(options)
+    options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    return options
+
+
+def _run(engine_path, paths, repeat):
+    '''Строит миниатюры в отдельном процессе, чтобы пиковый RSS
+    относился только к одному движку.'''
+    engine = import_string(engine_path)()
+    started = time.process_time()
+    for _ in range(repeat):
+        for path in paths:
+            source = ImageFile(path)
+            with open(path, 'rb') as raw:
+                data = raw.read()
+            for geometry_string, options in POST_THUMBNAILS.values():
+                options = _options(source, options)
+                image = engine.get_image(BytesIO(data))
+                geometry = parse_geometry(
+                    geometry_string, engine.get_image_ratio(image, options))
+                image = engine.create(image, geometry, options)
+                engine.write(image, options, BytesIO())
+    cpu = time.process_time() - started
+    # На Linux ru_maxrss в килобайтах.
+    return cpu, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время CPU и пиковую память движков миниатюр '
+            'на наборе картинок')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'corpus', nargs='?',
+            default=os.path.join(settings.MEDIA_ROOT, 'posts'),
+            help='Каталог с картинками (по умолчанию MEDIA_ROOT/posts)')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument(
+            '--engine', action='append', dest='engines',
+            help='Путь к движку; можно указать несколько раз')
+
+    def handle(self, *args, **options):
+        corpus = options['corpus']
+        if not os.path.isdir(corpus):
+            raise CommandError(f'Каталог {corpus} не найден')
+        # Картинки постов лежат в подкаталогах по префиксу хэша
+        # (posts.storage), поэтому каталог обходится целиком.
+        paths = sorted(
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(corpus)
+            for name in names if name.lower().endswith(IMAGE_EXTENSIONS))
+        if not paths:
+            raise CommandError(f'В {corpus} нет картинок')
+        engines = options['engines'] or [
+            DEFAULT_ENGINE, thumbnail_settings.THUMBNAIL_ENGINE]
+        self.stdout.write(f'Картинок: {len(paths)}, '
+                          f'повторов: {options["repeat"]}')
+        for engine in dict.fromkeys(engines):
+            # Новый процесс на каждый движок: ru_maxrss не уменьшается.
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                cpu, rss = executor.submit(
+                    _run, engine, paths, options['repeat']).result()
+            self.stdout.write(f'{engine}: CPU {cpu:.2f} с, '
+                              f'пик RSS {rss / 1024:.1f} МБ')
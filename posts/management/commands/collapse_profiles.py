@@ -0,0 +1,52 @@
+import glob
+import json
+import os
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Сводит профили медленных запросов в файл свёрнутых стеков '
+            'для flamegraph.pl, speedscope и подобных')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--view', action='append', default=[],
+            help='Только профили этого имени URL (можно повторять)')
+        parser.add_argument(
+            '--since', type=float, default=None,
+            help='Только профили не старше стольких часов')
+        parser.add_argument(
+            '--output', default=None,
+            help='Файл результата; по умолчанию — стандартный вывод')
+
+    def handle(self, *args, **options):
+        stacks = Counter()
+        profiles = 0
+        created_after = (time.time() - options['since'] * 60 * 60
+                         if options['since'] is not None else 0)
+        for path in sorted(glob.glob(
+                os.path.join(settings.PROFILE_DIR, '*.json'))):
+            if os.path.getmtime(path) < created_after:
+                continue
+            with open(path, encoding='utf-8') as dump:
+                profile = json.load(dump)
+            if options['view'] and profile['view'] not in options['view']:
+                continue
+            profiles += 1
+            # Имя URL — корень стека, чтобы представления не смешивались.
+            for stack, count in profile['stacks'].items():
+                stacks[f'{profile["view"]};{stack}'] += count
+        if not profiles:
+            raise CommandError('Подходящих профилей нет')
+        lines = ''.join(f'{stack} {count}\n'
+                        for stack, count in sorted(stacks.items()))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(lines)
+        else:
+            self.stdout.write(lines, ending='')
+        self.stderr.write(f'Профилей: {profiles}, стеков: {len(stacks)}')
@@ -0,0 +1,155 @@
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from posts.models import Post
+from posts.thumbnails import RELEASE_MIN_AGE, release_image
+
+BATCH_SIZE = 500
+
+
+class RateLimiter:
+    '''Не даёт удалять больше rate файлов в секунду.'''
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if now < self.next_at:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+def _walk(path):
+    '''Файлы дерева по одному, без списка всего каталога в памяти.'''
+    try:
+        entries = os.scandir(path)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def _batches(iterable, size=BATCH_SIZE):
+    iterable = iter(iterable)
+    while True:
+        batch = list(islice(iterable, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки, на которые не ссылается ни один пост, '
+            'миниатюры без записей sorl и записи sorl без файлов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено')
+        parser.add_argument(
+            '--rate', type=float, default=50,
+            help='Не больше стольких удалений в секунду '
+                 '(0 — без ограничения)')
+        parser.add_argument(
+            '--min-age', type=int, default=RELEASE_MIN_AGE,
+            help='Не трогать файлы моложе стольких секунд: их могли '
+                 'только что загрузить')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.limiter = RateLimiter(options['rate'])
+        self.min_age = options['min_age']
+        self.created_before = time.time() - self.min_age
+        originals = self.collect_originals()
+        entries = self.collect_kvstore()
+        thumbnails = self.collect_thumbnails()
+        prefix = 'Пробный прогон. ' if self.dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Картинок без постов: {originals}, записей sorl без '
+            f'файлов: {entries}, миниатюр без записей: {thumbnails}'))
+
+    def _files(self, directory):
+        root = os.path.join(settings.MEDIA_ROOT, directory)
+        for entry in _walk(root):
+            if entry.stat().st_mtime < self.created_before:
+                yield os.path.relpath(
+                    entry.path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+    def collect_originals(self):
+        upload_to = Post._meta.get_field('image').upload_to
+        removed = 0
+        for batch in _batches(self._files(upload_to)):
+            referenced = set(Post.objects.filter(
+                image__in=batch).values_list('image', flat=True))
+            for name in batch:
+                if name in referenced:
+                    continue
+                if self.dry_run:
+                    removed += 1
+                    continue
+                self.limiter.wait()
+                # release_image ещё раз проверяет ссылки прямо перед
+                # удалением, на случай поста, созданного после выборки.
+                removed += release_image(name, self.min_age)
+        return removed
+
+    def collect_kvstore(self):
+        '''Записи sorl о картинках, файлов которых больше нет. Таблица
+        читается пачками по возрастанию ключа.'''
+        prefix = add_prefix('', 'image')
+        removed = 0
+        last_key = ''
+        while True:
+            batch = list(KVStoreModel.objects.filter(
+                key__startswith=prefix, key__gt=last_key,
+            ).order_by('key').values_list('key', 'value')[:BATCH_SIZE])
+            if not batch:
+                return removed
+            last_key = batch[-1][0]
+            for _, value in batch:
+                image_file = deserialize_image_file(value)
+                try:
+                    if image_file.exists():
+                        continue
+                except SuspiciousFileOperation:
+                    # Файл вне MEDIA_ROOT хранилищу не принадлежит.
+                    continue
+                removed += 1
+                if not self.dry_run:
+                    self.limiter.wait()
+                    default.kvstore.delete(image_file)
+
+    def collect_thumbnails(self):
+        '''Файлы миниатюр, о которых sorl ничего не знает.'''
+        removed = 0
+        for batch in _batches(
+                self._files(thumbnail_settings.THUMBNAIL_PREFIX)):
+            files = {add_prefix(ImageFile(name, default.storage).key): name
+                     for name in batch}
+            known = set(KVStoreModel.objects.filter(
+                key__in=files).values_list('key', flat=True))
+            for key, name in files.items():
+                if key in known:
+                    continue
+                removed += 1
+                if not self.dry_run:
+                    self.limiter.wait()
+                    default.storage.delete(name)
+        return removed
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from yatube.profiling import TRIGGER_PARAMETER, trigger_token
+
+
+class Command(BaseCommand):
+    help = ('Выдаёт подписанный параметр, с которым запрос к пути будет '
+            'профилирован')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь запроса, например /follow/')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.stdout.write(f'{path}?{TRIGGER_PARAMETER}='
+                          f'{trigger_token(path)}')
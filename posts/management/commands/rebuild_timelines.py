@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.feeds import backfill_followers, switch_mode, wanted_mode
+from posts.models import UserStats
+
+
+class Command(BaseCommand):
+    help = ('Пересматривает режим лент авторов по текущим порогам '
+            'FEED_PULL_THRESHOLD/FEED_PUSH_THRESHOLD и раскладывает посты '
+            'push-авторов по лентам подписчиков')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recent', type=int, default=None,
+            help='Раскладывать только столько последних постов каждого '
+                 'автора (по умолчанию — все)')
+
+    def handle(self, *args, **options):
+        recent = options['recent']
+        switched = rebuilt = 0
+        authors = UserStats.objects.filter(followers_count__gt=0).values_list(
+            'user_id', 'followers_count', 'feed_pulled')
+        for author_id, followers_count, pulled in authors.iterator():
+            wanted = wanted_mode(followers_count, pulled)
+            # По автору на транзакцию: команда может идти долго, а
+            # прерванный прогон достаточно запустить ещё раз.
+            with transaction.atomic():
+                if wanted != pulled:
+                    switch_mode(author_id, wanted, recent)
+                    switched += 1
+                elif not wanted:
+                    backfill_followers(author_id, recent)
+            rebuilt += not wanted
+        self.stdout.write(self.style.SUCCESS(
+            f'Переключено авторов: {switched}, лент перестроено для '
+            f'авторов: {rebuilt}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount_posts, recount_user_stats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики комментариев, '
+            'записей и подписок')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            posts = recount_posts()
+            users = recount_user_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано постов: {posts}, пользователей: {users}'))
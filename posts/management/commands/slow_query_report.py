@@ -0,0 +1,81 @@
+import json
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube.slow_queries import normalize, plan_problems
+
+
+class Shape:
+    def __init__(self):
+        self.durations = []
+        self.views = Counter()
+        self.templates = Counter()
+        self.plan = None
+        self.sql = None
+
+    @property
+    def total(self):
+        return sum(self.durations)
+
+
+class Command(BaseCommand):
+    help = ('Группирует журнал медленных запросов по форме SQL и '
+            'показывает планы, в которых не хватает индекса')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'logs', nargs='*',
+            help='Файлы журнала; по умолчанию — SLOW_QUERY_LOG')
+        parser.add_argument(
+            '--top', type=int, default=20,
+            help='Сколько форм показать, по убыванию суммарного времени')
+
+    def handle(self, *args, **options):
+        shapes = defaultdict(Shape)
+        for path in options['logs'] or [settings.SLOW_QUERY_LOG]:
+            try:
+                log = open(path, encoding='utf-8')
+            except FileNotFoundError:
+                raise CommandError(f'Нет файла журнала {path}')
+            with log:
+                for line in log:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    # Форма пересчитывается, чтобы старые записи
+                    # группировались по нынешним правилам.
+                    sql = normalize(entry.get('shape') or entry['sql'])
+                    shape = shapes[sql]
+                    shape.durations.append(entry['duration_ms'])
+                    shape.views[entry.get('view') or '-'] += 1
+                    shape.templates[entry.get('template') or '-'] += 1
+                    if entry.get('plan'):
+                        shape.plan, shape.sql = entry['plan'], sql
+        if not shapes:
+            raise CommandError('Медленных запросов нет')
+        ranked = sorted(shapes.items(), key=lambda item: item[1].total,
+                        reverse=True)
+        for sql, shape in ranked[:options['top']]:
+            durations = sorted(shape.durations)
+            self.stdout.write(self.style.SQL_KEYWORD(
+                f'{len(durations)} раз, всего {shape.total:.0f} мс, '
+                f'медиана {durations[len(durations) // 2]:.0f} мс, '
+                f'максимум {durations[-1]:.0f} мс'))
+            self.stdout.write(sql)
+            self.stdout.write('Представления: ' + ', '.join(
+                f'{view} ({count})'
+                for view, count in shape.views.most_common()))
+            self.stdout.write('Шаблоны: ' + ', '.join(
+                f'{template} ({count})'
+                for template, count in shape.templates.most_common()))
+            problems = plan_problems(shape.plan, shape.sql)
+            for detail in shape.plan or ():
+                if detail in problems:
+                    self.stdout.write(self.style.WARNING(
+                        f'  {detail}  <- нет подходящего индекса'))
+                else:
+                    self.stdout.write(f'  {detail}')
+            self.stdout.write('')
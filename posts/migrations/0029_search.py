@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def install_search(apps, schema_editor):
+    from posts.search import install
+    install(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    from posts.search import uninstall
+    uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0028_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
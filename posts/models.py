@@ -2,9 +2,17 @@ from django.contrib.auth import get_user_model
 from django.db import models
 from django.db.models.constraints import UniqueConstraint
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        '''Всё, что нужно карточке поста в ленте, одним запросом.'''
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст записи',
                             help_text='Введите текст публикации')
@@ -15,11 +23,30 @@ class Post(models.Model):
                               blank=True, null=True, related_name='posts',
                               verbose_name='Группа',
                               help_text='Введите название группы')
+    # Одинаковые картинки хранятся одним файлом, см. posts.storage.
     image = models.ImageField(
-        upload_to='posts/', blank=True, null=True, verbose_name='Картинка')
+        upload_to='posts/', storage=ContentAddressedStorage(),
+        blank=True, null=True, verbose_name='Картинка')
+    comments_count = models.PositiveIntegerField(
+        'Комментариев', default=0, editable=False)
+    # Растёт при каждом изменении, которое видно в карточке поста; входит
+    # в ключ кэша карточки, поэтому старые версии просто перестают читаться.
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+            # Число постов с тем же файлом картинки перед его удалением.
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -30,6 +57,7 @@ class Group(models.Model):
     slug = models.SlugField(unique=True, null=False,
                             verbose_name='Ссылка группы')
     description = models.TextField(verbose_name='Описание')
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     def __str__(self):
         return self.title
@@ -44,6 +72,12 @@ class Comment(models.Model):
         help_text='Введите текст комментария', verbose_name='Текст', max_length=300)
     created = models.DateTimeField('Дата публикации', auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', '-created'],
+                         name='comment_post_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -54,4 +88,59 @@ class Follow(models.Model):
         related_name='following', null=True)
 
     class Meta:
-        UniqueConstraint(fields=['author', 'user'], name='unique_follow')
+        constraints = [
+            UniqueConstraint(fields=['user', 'author'], name='unique_follow'),
+        ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    '''Материализованная лента подписок: по строке на пост для каждого
+    подписчика его автора. Автор и дата поста продублированы, чтобы
+    лента читалась одним диапазоном по индексу (user, pub_date), а
+    отписка удаляла строки по (user, author) без join.
+    '''
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['user', 'post'],
+                             name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    '''Счётчики пользователя, которые иначе пришлось бы считать COUNT(*)
+    на каждой странице профиля. Поддерживаются сигналами, расхождения
+    исправляет команда recount_stats.
+    '''
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True,
+        related_name='stats')
+    posts_count = models.PositiveIntegerField('Записей', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    # Посты подтягиваются в ленты при чтении, а не раскладываются (см.
+    # posts.feeds). Режим хранится, а не выводится из followers_count,
+    # чтобы автор у порога не переключался туда и обратно.
+    feed_pulled = models.BooleanField('Лента по запросу', default=False)
+
+    @classmethod
+    def for_user(cls, user):
+        stats, _ = cls.objects.get_or_create(user=user)
+        return stats
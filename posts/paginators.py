@@ -0,0 +1,223 @@
+import base64
+import binascii
+
+from django.core.paginator import Paginator
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .cache import CachedCount
+
+POSTS_PER_PAGE = 10
+
+# Ключ ленты: сначала дата публикации, затем id для стабильного порядка
+# постов, опубликованных в одну и ту же секунду.
+FEED_ORDERING = ('-pub_date', '-id')
+
+# Больше стольких строк отфильтрованный список админки не пересчитывает.
+ESTIMATED_COUNT_LIMIT = 10000
+
+
+def encode_cursor(values, direction):
+    '''Упаковывает значения ключа в непрозрачный токен для URL. Первое
+    значение — дата публикации или числовой ранг (см. posts.search).'''
+    first, pk = values
+    first = first.isoformat() if hasattr(first, 'isoformat') else repr(first)
+    raw = f'{direction}|{first}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def parse_pub_date(raw):
+    '''Первое значение ключа ленты; None, если это не дата.'''
+    return parse_datetime(raw)
+
+
+def decode_cursor(token, parse=parse_pub_date):
+    '''Возвращает (direction, values) или None для испорченного токена.
+
+    parse разбирает первое значение ключа и возвращает None (или бросает
+    ValueError), если значение не того типа: токен другого паджинатора
+    тоже открывает первую страницу, а не доходит до запроса.
+    '''
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, raw_first, pk = raw.split('|')
+        first = parse(raw_first)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if first is None or direction not in ('next', 'prev'):
+        return None
+    return direction, (first, pk)
+
+
+def cursor_values(obj):
+    return obj.pub_date, obj.pk
+
+
+def seek(queryset, ordering, values, reverse, limit):
+    '''Возвращает не более limit объектов, лежащих строго после values
+    в порядке ordering (или строго перед ними, если reverse=True).
+
+    Условие (a, b) < (x, y) разворачивается в
+    a <= x AND (a < x OR (a = x AND b < y)): избыточное a <= x SQLite
+    использует как границу диапазона индекса, поэтому запрос начинает с
+    позиции курсора и не зависит от глубины страницы. Без него OR
+    не даёт диапазона, и индекс просматривается от самой новой строки.
+    '''
+    date_field, pk_field = (name.lstrip('-') for name in ordering)
+    if reverse:
+        ordering = tuple(name.lstrip('-') for name in ordering)
+    if values is not None:
+        pub_date, pk = values
+        op = 'gt' if reverse else 'lt'
+        queryset = queryset.filter(
+            **{f'{date_field}__{op}e': pub_date}
+        ).filter(
+            Q(**{f'{date_field}__{op}': pub_date})
+            | Q(**{date_field: pub_date, f'{pk_field}__{op}': pk})
+        )
+    return list(queryset.order_by(*ordering)[:limit])
+
+
+class CursorPage:
+    '''Страница курсорного паджинатора.
+
+    Повторяет ту часть интерфейса django.core.paginator.Page, которую
+    использует paginator.html, но вместо номеров страниц отдаёт токены
+    next_cursor/previous_cursor.
+    '''
+
+    def __init__(self, object_list, has_previous, has_next,
+                 key=cursor_values):
+        self.object_list = object_list
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self.key = key
+
+    def __repr__(self):
+        return f'<CursorPage {self.previous_cursor} .. {self.next_cursor}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return encode_cursor(self.key(self.object_list[-1]), 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return encode_cursor(self.key(self.object_list[0]), 'prev')
+
+
+class CursorPaginator:
+    '''Keyset-паджинатор по (pub_date, id) или по другому ключу, который
+    возвращает key(obj); parse разбирает первое значение этого ключа из
+    курсора (см. decode_cursor).
+
+    В отличие от Paginator не считает COUNT(*) и не использует OFFSET:
+    каждая страница — один запрос LIMIT per_page + 1 от позиции курсора.
+    Если object_list умеет seek() сам (например, составная лента), он
+    используется вместо фильтрации queryset.
+    '''
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING,
+                 key=cursor_values, parse=parse_pub_date):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = ordering
+        self.key = key
+        self.parse = parse
+
+    def _seek(self, values, reverse, limit):
+        own_seek = getattr(self.object_list, 'seek', None)
+        if own_seek is not None:
+            return own_seek(values, reverse, limit)
+        return seek(self.object_list, self.ordering, values, reverse, limit)
+
+    def get_page(self, cursor):
+        decoded = decode_cursor(cursor, self.parse) if cursor else None
+        if decoded is None:
+            objects = self._seek(None, False, self.per_page + 1)
+            return CursorPage(objects[:self.per_page], False,
+                              len(objects) > self.per_page, self.key)
+        direction, values = decoded
+        if direction == 'prev':
+            objects = self._seek(values, True, self.per_page + 1)
+            has_previous = len(objects) > self.per_page
+            objects = objects[:self.per_page][::-1]
+            return CursorPage(objects, has_previous, True, self.key)
+        objects = self._seek(values, False, self.per_page + 1)
+        return CursorPage(objects[:self.per_page], True,
+                          len(objects) > self.per_page, self.key)
+
+
+def paginate(request, object_list, per_page=POSTS_PER_PAGE,
+             ordering=FEED_ORDERING, count_scopes=None):
+    '''Возвращает (paginator, page) для ленты.
+
+    Запрос с ?cursor= обслуживается курсорным паджинатором, иначе —
+    обычным постраничным Paginator. В номерную страницу добавляются
+    курсоры соседних страниц, поэтому навигация «вперёд/назад» сразу
+    переходит на keyset-режим. С count_scopes число постов для Paginator
+    кэшируется по поколениям этих областей (см. posts.cache.CachedCount).
+    Если лента ограничивает глубину номерных страниц (max_depth, см.
+    posts.feeds.FollowFeed), с последней из них дальше ведёт курсор.
+    '''
+    cursor = request.GET.get('cursor')
+    if cursor is not None:
+        paginator = CursorPaginator(object_list, per_page, ordering)
+        return paginator, paginator.get_page(cursor)
+    max_depth = getattr(object_list, 'max_depth', None)
+    if count_scopes is not None:
+        object_list = CachedCount(object_list, count_scopes)
+    paginator = Paginator(object_list, per_page)
+    page = paginator.get_page(request.GET.get('page'))
+    objects = list(page.object_list)
+    page.object_list = objects
+    page.next_cursor = page.previous_cursor = None
+    truncated = max_depth is not None and paginator.count >= max_depth
+    if objects and (page.has_next() or truncated):
+        page.next_cursor = encode_cursor(cursor_values(objects[-1]), 'next')
+    if objects and page.has_previous():
+        page.previous_cursor = encode_cursor(
+            cursor_values(objects[0]), 'prev')
+    return paginator, page
+
+
+class EstimatedCountPaginator(Paginator):
+    '''Paginator для больших таблиц в админке, без COUNT(*) по всей
+    таблице.
+
+    Без фильтров число строк оценивается по max(pk) через индекс
+    первичного ключа: удалённые строки дают небольшой завышенный остаток.
+    С фильтром или поиском строки считаются точно, но не дальше
+    ESTIMATED_COUNT_LIMIT.
+    '''
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return queryset.aggregate(estimate=Max('pk'))['estimate'] or 0
+        return queryset.order_by()[:ESTIMATED_COUNT_LIMIT].count()
@@ -0,0 +1,163 @@
+'''Полнотекстовый поиск по постам и комментариям на SQLite FTS5.
+
+Индексы posts_post_fts и posts_comment_fts — FTS5-таблицы с внешним
+содержимым: текст хранится только в самих posts_post и posts_comment, а
+триггеры обновляют индекс при любой записи, включая update() и удаление
+каскадом. Ранжирование — bm25, совпадение в комментарии весит меньше,
+чем в тексте поста.
+'''
+import math
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+COMMENT_WEIGHT = 0.5
+
+INDEXES = {
+    'posts_post_fts': ('posts_post', 'id'),
+    'posts_comment_fts': ('posts_comment', 'id'),
+}
+
+TRIGGERS = '''
+CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO {index}(rowid, text) VALUES (new.{pk}, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO {index}({index}, rowid, text)
+    VALUES ('delete', old.{pk}, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF text ON {table}
+BEGIN
+    INSERT INTO {index}({index}, rowid, text)
+    VALUES ('delete', old.{pk}, old.text);
+    INSERT INTO {index}(rowid, text) VALUES (new.{pk}, new.text);
+END;
+'''
+
+SEARCH_SQL = f'''
+    SELECT post_id, MIN(rank) AS search_rank FROM (
+        SELECT rowid AS post_id, bm25(posts_post_fts) AS rank
+        FROM posts_post_fts WHERE posts_post_fts MATCH %s
+        UNION ALL
+        SELECT comment.post_id, bm25(posts_comment_fts) * {COMMENT_WEIGHT}
+        FROM posts_comment_fts
+        JOIN posts_comment AS comment ON comment.id = posts_comment_fts.rowid
+        WHERE posts_comment_fts MATCH %s AND comment.post_id IS NOT NULL
+    )
+    GROUP BY post_id
+'''
+
+WORD = re.compile(r'\w+')
+
+
+def available(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def install(using=connection):
+    '''Создаёт индексы и триггеры, если их нет, и заполняет индекс заново,
+    если не хватало хотя бы одного триггера.
+
+    Миграции SQLite пересоздают таблицу при изменении поля, и её триггеры
+    пропадают, поэтому функция вызывается ещё и после каждого migrate.
+    '''
+    if not available(using):
+        return
+    with using.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='trigger'")
+        triggers = {name for name, in cursor.fetchall()}
+        for index, (table, pk) in INDEXES.items():
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+                f"text, content='{table}', content_rowid='{pk}')")
+            names = {f'{index}_{event}'
+                     for event in ('insert', 'delete', 'update')}
+            if names <= triggers:
+                continue
+            for statement in TRIGGERS.format(
+                    index=index, table=table, pk=pk).split('END;'):
+                if statement.strip():
+                    cursor.execute(statement + 'END;')
+            cursor.execute(
+                f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+
+def uninstall(using=connection):
+    if not available(using):
+        return
+    with using.cursor() as cursor:
+        for index in INDEXES:
+            for event in ('insert', 'delete', 'update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {index}_{event}')
+            cursor.execute(f'DROP TABLE IF EXISTS {index}')
+
+
+def match_expression(query):
+    '''Превращает пользовательский ввод в запрос FTS5: каждое слово — в
+    кавычках, последнее ещё и как префикс. Операторы FTS5 из ввода не
+    проходят, поэтому запрос не может быть синтаксически неверным.'''
+    words = WORD.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def matching_ids(model, query):
+    '''Подзапрос id записей model, текст которых подходит под query.'''
+    expression = match_expression(query)
+    if expression is None:
+        return model.objects.none().values('pk')
+    index = f'{model._meta.db_table}_fts'
+    return RawSQL(f'SELECT rowid FROM {index} WHERE {index} MATCH %s',
+                  [expression])
+
+
+class SearchResults:
+    '''Посты, подходящие под запрос, по возрастанию (bm25, id).
+
+    Понимает seek() курсорного паджинатора: каждая страница — один запрос
+    к индексам с условием по ключу предыдущей страницы вместо OFFSET.
+    '''
+
+    def __init__(self, query):
+        self.expression = match_expression(query)
+
+    def seek(self, values, reverse, limit):
+        if self.expression is None:
+            return []
+        sql = SEARCH_SQL
+        params = [self.expression, self.expression]
+        if values is not None:
+            sql += f"HAVING (search_rank, post_id) {'<' if reverse else '>'}"
+            sql += ' (%s, %s)'
+            params.extend(values)
+        direction = 'DESC' if reverse else 'ASC'
+        sql += f' ORDER BY search_rank {direction}, post_id {direction}'
+        sql += ' LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            ranks = dict(cursor.fetchall())
+        posts = Post.objects.for_feed().in_bulk(ranks)
+        results = []
+        for pk, rank in ranks.items():
+            if pk in posts:
+                posts[pk].search_rank = rank
+                results.append(posts[pk])
+        return results
+
+
+def search_values(post):
+    return post.search_rank, post.pk
+
+
+def parse_rank(raw):
+    '''Первое значение ключа поиска из курсора; None, если это не
+    конечное число.'''
+    rank = float(raw)
+    return rank if math.isfinite(rank) else None
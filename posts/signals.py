@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feeds, thumbnails
+from .cache import (FEED, GROUPS, author_scope, bump_generations,
+                    bump_post_generations, follow_scope, forget_group,
+                    group_scope)
+from .models import Comment, Follow, Group, Post
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Group)
+def bump_version(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance.version += 1
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_state(sender, instance, **kwargs):
+    # При переносе поста устаревает и страница группы, откуда он ушёл, а
+    # заменённая картинка может остаться без ссылок.
+    instance._old_group_id = instance._old_image = None
+    if not instance._state.adding:
+        instance._old_group_id, instance._old_image = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', 'image').first() or (
+                None, None)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    bump_post_generations(instance.author_id, instance.group_id,
+                          getattr(instance, '_old_group_id', None))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    post = Post.objects.filter(pk=instance.post_id).values(
+        'author_id', 'group_id').first()
+    if post is not None:
+        bump_post_generations(post['author_id'], post['group_id'])
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    forget_group(instance.pk)
+    bump_generations(FEED, GROUPS, group_scope(instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    # Счётчики подписок видны в профилях обеих сторон, а у подписчика
+    # меняется ещё и лента подписок.
+    bump_generations(author_scope(instance.author_id),
+                     author_scope(instance.user_id),
+                     follow_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        counters.post_added(instance)
+        feeds.fan_out_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.post_added(instance, -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.comment_added(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.comment_added(instance, -1)
+
+
+# Счётчики подписок обновляются раньше ленты: feeds решает, раскладывать
+# ли посты автора, по уже обновлённому числу его подписчиков.
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.follow_added(instance)
+        if instance.user_id and instance.author_id:
+            feeds.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.follow_added(instance, -1)
+    if instance.user_id and instance.author_id:
+        feeds.purge(instance.user_id, instance.author_id)
+
+
+# Файл удаляется только после коммита: при откате ссылка на него остаётся.
+@receiver(post_save, sender=Post)
+def post_image_replaced(sender, instance, **kwargs):
+    old_image = getattr(instance, '_old_image', None)
+    if old_image and old_image != instance.image.name:
+        transaction.on_commit(lambda: thumbnails.release_image(old_image))
+
+
+@receiver(post_delete, sender=Post)
+def post_image_deleted(sender, instance, **kwargs):
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: thumbnails.release_image(name))
@@ -0,0 +1,59 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CONTENT_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.[^/]*)?$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    '''Хранилище, в котором имя файла — sha256 его содержимого.
+
+    Одинаковые картинки из разных постов ложатся в один файл: повторная
+    загрузка ничего не пишет на диск, а миниатюры sorl, ключом которых
+    служит имя исходника, строятся для такого файла один раз. Удаляет
+    файлы thumbnails.release_image, когда на них не ссылается ни один пост
+    и файл давно не загружали.
+    '''
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя значит одинаковое содержимое, поэтому суффиксы
+        # для уникальности не нужны. Занятое имя по хэшу сюда приходит
+        # только из цикла повторов FileSystemStorage._save, когда такой же
+        # файл успел записать параллельный запрос: исключение выводит из
+        # цикла, который иначе получал бы то же имя бесконечно.
+        if CONTENT_NAME.search(name) and self.exists(name):
+            raise FileExistsError(name)
+        return name
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        hexdigest = digest.hexdigest()
+        return os.path.join(directory, hexdigest[:2], hexdigest + extension)
+
+    def _touch(self, name):
+        '''Обновляет время существующего файла, чтобы release_image не
+        удалил его, пока пост с повторной загрузкой не закоммичен.
+        Возвращает False, если файла нет.'''
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self._touch(name):
+            return name
+        try:
+            return super()._save(name, content)
+        except FileExistsError:
+            self._touch(name)
+            return name
@@ -0,0 +1,28 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(paginator, page, on_each_side=2, on_ends=1):
+    '''Номера страниц вокруг текущей и по краям ленты, None на месте
+    пропуска. Весь page_range глубокой ленты дал бы тысячи ссылок.'''
+    number = getattr(page, 'number', None)
+    if number is None:
+        # Курсорная страница: номеров нет.
+        return []
+    num_pages = paginator.num_pages
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        return list(paginator.page_range)
+    start = max(number - on_each_side, 1)
+    end = min(number + on_each_side, num_pages)
+    if start > on_ends + 2:
+        pages = [*range(1, on_ends + 1), None]
+    else:
+        pages = list(range(1, start))
+    pages.extend(range(start, end + 1))
+    if end < num_pages - on_ends - 1:
+        pages.extend([None, *range(num_pages - on_ends + 1, num_pages + 1)])
+    else:
+        pages.extend(range(end + 1, num_pages + 1))
+    return pages
@@ -0,0 +1,27 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_thumbnail(context, post):
+    '''Готовые миниатюры карточки поста (thumbnails.CardImage). Если
+    их ещё нет, ставит построение в очередь и возвращает None, а шаблон
+    показывает исходную картинку.
+
+    Списки постов заранее кладут в контекст словарь thumbnails (см.
+    thumbnails.prefetch_thumbnails), и тег берёт миниатюры из него.'''
+    if not post.image:
+        return None
+    prefetched = context.get('thumbnails')
+    if prefetched is not None and post.image.name in prefetched:
+        found = prefetched[post.image.name]
+    else:
+        found = thumbnails.lookup_thumbnails([post.image])[post.image.name]
+    image = thumbnails.card_image(found)
+    if image is None:
+        context['thumbnail_pending'] = True
+        thumbnails.enqueue(post)
+    return image
@@ -0,0 +1,60 @@
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post, User
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@mail.ru', password='123')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def create_rows(self, count):
+        for i in range(count):
+            author = User.objects.create(username=f'user{Post.objects.count()}')
+            post = Post.objects.create(text=f'Пост {i}', author=author)
+            Comment.objects.create(post=post, author=author, text='Да')
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in context.captured_queries
+                if 'SAVEPOINT' not in query['sql']]
+
+    def test_changelists_do_not_grow_with_rows(self):
+        '''Число запросов списка не зависит от числа строк, а COUNT(*) по
+        всей таблице не выполняется.'''
+        for name in ('admin:posts_post_changelist',
+                     'admin:posts_comment_changelist'):
+            with self.subTest(changelist=name):
+                self.create_rows(2)
+                few = self.queries(reverse(name))
+                self.create_rows(10)
+                many = self.queries(reverse(name))
+                self.assertEqual(len(few), len(many))
+                self.assertFalse([sql for sql in many if 'COUNT(' in sql])
+
+    def test_search_finds_comments_by_text(self):
+        '''Поиск комментариев работает по тексту.'''
+        self.create_rows(1)
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'да'})
+        self.assertContains(response, 'Пост 0')
+
+    def test_change_form_has_no_full_selects(self):
+        '''Форма комментария не выводит всех пользователей и посты.'''
+        self.create_rows(3)
+        comment = Comment.objects.first()
+        response = self.client.get(reverse(
+            'admin:posts_comment_change', args=[comment.pk]))
+        self.assertNotContains(response, 'user1</option>')
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
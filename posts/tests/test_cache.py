@@ -0,0 +1,266 @@
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.cache import FOLLOW_PAGES_PER_USER, card_cache_stats, get_group
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='VVV',
+            email='vv@mail.ru',
+            password='123'
+        )
+        cls.group = Group.objects.create(
+            title='cat',
+            slug='cat',
+            description='Test description',
+        )
+        cls.post = Post.objects.create(
+            text='Текст', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def get_profile(self):
+        before = card_cache_stats()
+        response = self.guest_client.get(
+            reverse('profile', kwargs={'username': 'VVV'}))
+        after = card_cache_stats()
+        return (response, after['hits'] - before['hits'],
+                after['misses'] - before['misses'])
+
+    def test_card_is_served_from_cache(self):
+        '''Повторный показ карточки берётся из кэша.'''
+        _, hits, misses = self.get_profile()
+        self.assertEqual((hits, misses), (0, 1))
+        _, hits, misses = self.get_profile()
+        self.assertEqual((hits, misses), (1, 0))
+
+    def test_comment_and_group_change_refresh_card(self):
+        '''Новый комментарий и правка группы меняют версию карточки.'''
+        self.get_profile()
+        Comment.objects.create(post=self.post, author=self.user, text='Да')
+        self.group.title = 'dog'
+        self.group.save()
+        response, hits, misses = self.get_profile()
+        self.assertEqual(misses, 1)
+        self.assertContains(response, 'Комментариев: 1')
+        self.assertContains(response, '#dog')
+
+    def test_username_change_refreshes_card(self):
+        '''После смены имени автора карточка ссылается на новый профиль.'''
+        self.get_profile()
+        author = User.objects.get(pk=self.user.pk)
+        author.username = 'WWW'
+        author.save()
+        before = card_cache_stats()
+        response = self.guest_client.get(
+            reverse('profile', kwargs={'username': 'WWW'}))
+        self.assertEqual(card_cache_stats()['misses'] - before['misses'], 1)
+        self.assertContains(
+            response, reverse('profile', kwargs={'username': 'WWW'}))
+        self.assertNotContains(
+            response, reverse('profile', kwargs={'username': 'VVV'}))
+
+
+class GenerationalPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='VVV',
+            email='vv@mail.ru',
+            password='123'
+        )
+        cls.post = Post.objects.create(text='Первый', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_index_is_cached_until_write(self):
+        '''Главная отдаётся из кэша, пока не изменились данные ленты.'''
+        self.guest_client.get(reverse('index'))
+        # update() не шлёт сигналов, поэтому поколение не меняется, а
+        # новая версия поста исключает ответ из кэша карточек.
+        Post.objects.update(text='Изменён втихую', version=F('version') + 1)
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Первый')
+
+    def test_new_post_invalidates_index_immediately(self):
+        '''Новый пост виден на главной сразу, без ожидания TTL.'''
+        self.guest_client.get(reverse('index'))
+        Post.objects.create(text='Второй', author=self.user)
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Второй')
+
+    def test_comment_invalidates_index(self):
+        '''Комментарий сдвигает поколение ленты.'''
+        self.guest_client.get(reverse('index'))
+        Comment.objects.create(post=self.post, author=self.user, text='Да')
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Комментариев: 1')
+
+
+class FollowFeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='VVV', password='123')
+        cls.other = User.objects.create(username='AAA', password='123')
+        cls.author = User.objects.create(username='SSS', password='123')
+        Post.objects.create(text='Пост автора', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.other_client = Client()
+        self.other_client.force_login(self.other)
+
+    def test_follow_feed_is_not_shared(self):
+        '''Лента подписок одного пользователя не отдаётся другому.'''
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertContains(response, 'Пост автора')
+        response = self.other_client.get(reverse('follow_index'))
+        self.assertNotContains(response, 'Пост автора')
+
+    def test_followed_author_post_invalidates_feed(self):
+        '''Новый пост автора из подписок сразу виден в ленте.'''
+        Follow.objects.create(user=self.user, author=self.author)
+        self.authorized_client.get(reverse('follow_index'))
+        Post.objects.create(text='Свежий пост', author=self.author)
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertContains(response, 'Свежий пост')
+
+    def test_group_rename_invalidates_feed(self):
+        '''Новое название группы сразу видно в ленте подписок.'''
+        group = Group.objects.create(title='Old', slug='old',
+                                     description='Описание')
+        Post.objects.create(text='Пост в группе', author=self.author,
+                            group=group)
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertContains(
+            self.authorized_client.get(reverse('follow_index')), '#Old')
+        group.title = 'New'
+        group.save()
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertContains(response, '#New')
+
+    def test_pages_per_user_are_bounded(self):
+        '''Для пользователя хранится не больше FOLLOW_PAGES_PER_USER
+        страниц ленты.'''
+        for i in range(FOLLOW_PAGES_PER_USER + 3):
+            self.authorized_client.get(reverse('follow_index'), {'page': i})
+        ring = cache.get(f'page_ring:follow_index:{self.user.pk}')
+        self.assertEqual(len(ring), FOLLOW_PAGES_PER_USER)
+        self.assertEqual(len(cache.get_many(ring)), FOLLOW_PAGES_PER_USER)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='VVV', password='123')
+        cls.post = Post.objects.create(text='Текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_unchanged_pages_return_304(self):
+        '''Неизменившиеся страницы отвечают 304 по ETag.'''
+        urls = [
+            reverse('index'),
+            reverse('profile', kwargs={'username': 'VVV'}),
+            reverse('post', kwargs={'username': 'VVV',
+                                    'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_comment_changes_post_etag(self):
+        '''Новый комментарий меняет ETag страницы поста.'''
+        url = reverse('post', kwargs={'username': 'VVV',
+                                      'post_id': self.post.pk})
+        etag = self.guest_client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.user, text='Да')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_group_rename_changes_profile_etag(self):
+        '''Переименование группы меняет ETag профиля, где видно её
+        название.'''
+        group = Group.objects.create(title='Old', slug='old',
+                                     description='Описание')
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        url = reverse('profile', kwargs={'username': 'VVV'})
+        etag = self.guest_client.get(url)['ETag']
+        group.title = 'New'
+        group.save()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, '#New')
+
+    def test_edited_post_is_not_revalidated_by_date(self):
+        '''Правка поста не прячется за 304 по If-Modified-Since: страницы
+        сверяются только по ETag.'''
+        url = reverse('post', kwargs={'username': 'VVV',
+                                      'post_id': self.post.pk})
+        response = self.guest_client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertContains(response, 'Исправленный текст')
+
+
+class GroupLookupTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='cat', slug='cat', description='Test description')
+
+    def test_group_is_read_once(self):
+        '''Повторный поиск группы по slug не ходит в базу.'''
+        get_group('cat')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_group('cat'), self.group)
+        self.assertEqual(len(queries), 0)
+
+    def test_saved_group_is_reread(self):
+        '''Сохранение группы сбрасывает запись LRU.'''
+        get_group('cat')
+        Group.objects.filter(pk=self.group.pk).update(title='dog')
+        self.assertEqual(get_group('cat').title, 'cat')
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'dog'
+        group.save()
+        self.assertIsNone(get_group('cat'))
+        self.assertEqual(get_group('dog').title, 'dog')
+
+    def test_group_pages_are_paginated(self):
+        '''Вторая страница группы существует и содержит старые посты.'''
+        user = User.objects.create(username='VVV', password='123')
+        for i in range(15):
+            Post.objects.create(text=f'Пост {i}', author=user,
+                                group=self.group)
+        response = Client().get(reverse('group', kwargs={'slug': 'cat'}),
+                                {'page': 2})
+        self.assertEqual(len(response.context['page']), 5)
+        self.assertContains(response, 'Пост 0')
@@ -0,0 +1,75 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Post, User, UserStats
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='VVV',
+            email='vv@mail.ru',
+            password='123'
+        )
+        cls.author = User.objects.create(
+            username='SSS',
+            email='ss@mail.ru',
+            password='123'
+        )
+
+    def test_post_and_comment_counters(self):
+        '''Создание и удаление постов и комментариев двигает счётчики.'''
+        post = Post.objects.create(text='Текст', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Коммент')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(UserStats.for_user(self.author).posts_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.assertEqual(UserStats.for_user(self.author).posts_count, 0)
+
+    def test_follow_counters(self):
+        '''Подписка и отписка меняют счётчики обеих сторон.'''
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(UserStats.for_user(self.author).followers_count, 1)
+        self.assertEqual(UserStats.for_user(self.user).following_count, 1)
+        follow.delete()
+        self.assertEqual(UserStats.for_user(self.author).followers_count, 0)
+        self.assertEqual(UserStats.for_user(self.user).following_count, 0)
+
+    def test_recount_stats_repairs_drift(self):
+        '''Команда recount_stats восстанавливает разъехавшиеся счётчики.'''
+        post = Post.objects.create(text='Текст', author=self.author)
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.update(comments_count=7)
+        UserStats.objects.update(posts_count=5, followers_count=5)
+        call_command('recount_stats', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        stats = UserStats.for_user(self.author)
+        self.assertEqual((stats.posts_count, stats.followers_count), (1, 1))
+
+    def test_deleting_user_with_content(self):
+        '''Пользователя с постами, комментариями и подписками можно
+        удалить: счётчики не воскрешают его строку UserStats.'''
+        author = User.objects.create(username='Leaving', password='123')
+        post = Post.objects.create(text='Текст', author=author)
+        Post.objects.create(text='Ещё текст', author=author)
+        Comment.objects.create(post=post, author=author, text='Да')
+        Comment.objects.create(post=post, author=self.user, text='Нет')
+        Follow.objects.create(user=self.user, author=author)
+        Follow.objects.create(user=author, author=self.user)
+        author_id = author.pk
+        author.delete()
+        connection.check_constraints()
+        self.assertFalse(UserStats.objects.filter(user_id=author_id).exists())
+        self.assertFalse(Post.objects.exists())
@@ -0,0 +1,174 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import feeds
+from posts.cache import author_scope, get_generations
+from posts.models import Follow, Post, TimelineEntry, User, UserStats
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='VVV',
+            email='vv@mail.ru',
+            password='123'
+        )
+        cls.author = User.objects.create(
+            username='SSS',
+            email='ss@mail.ru',
+            password='123'
+        )
+        for i in range(3):
+            Post.objects.create(text=f'Старый {i}', author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_follow_backfills_timeline(self):
+        '''Подписка переносит в ленту уже опубликованные посты автора.'''
+        self.authorized_client.get(
+            reverse('profile_follow', kwargs={'username': 'SSS'}))
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 3)
+
+    @override_settings(FEED_BACKFILL_POSTS=2)
+    def test_follow_backfill_is_bounded(self):
+        '''Подписка раскладывает в ленту только последние посты автора.'''
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(
+            [entry.post.text for entry in TimelineEntry.objects.filter(
+                user=self.user).order_by(*feeds.TIMELINE_ORDERING)],
+            ['Старый 2', 'Старый 1'])
+
+    def test_new_post_fans_out_to_followers(self):
+        '''Новый пост автора сразу попадает в ленты подписчиков.'''
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Новый', author=self.author)
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(response.context['page'][0], post)
+        self.assertEqual(len(response.context['page']), 4)
+
+    def test_unfollow_purges_timeline(self):
+        '''Отписка убирает посты автора из ленты.'''
+        Follow.objects.create(user=self.user, author=self.author)
+        self.authorized_client.get(
+            reverse('profile_unfollow', kwargs={'username': 'SSS'}))
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+    def test_follow_feed_cursor_pages(self):
+        '''Лента подписок листается курсором в порядке публикации.'''
+        Follow.objects.create(user=self.user, author=self.author)
+        for i in range(10):
+            Post.objects.create(text=f'Новый {i}', author=self.author)
+        response = self.authorized_client.get(reverse('follow_index'))
+        response = self.authorized_client.get(
+            reverse('follow_index'),
+            {'cursor': response.context['page'].next_cursor})
+        self.assertEqual([post.text for post in response.context['page']],
+                         ['Старый 2', 'Старый 1', 'Старый 0'])
+
+    def test_numbered_page_is_sliced_in_sql(self):
+        '''Номерная страница ленты без «знаменитостей» читает из базы
+        только свои посты.'''
+        Follow.objects.create(user=self.user, author=self.author)
+        for i in range(10):
+            Post.objects.create(text=f'Новый {i}', author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(
+                reverse('follow_index'), {'page': 2})
+        self.assertEqual(len(response.context['page']), 3)
+        self.assertTrue(any('LIMIT 3 OFFSET 10' in query['sql']
+                            for query in queries))
+
+
+@override_settings(FEED_PULL_THRESHOLD=3, FEED_PUSH_THRESHOLD=2,
+                   FEED_BACKFILL_POSTS=2)
+class HybridFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='VVV', password='123')
+        cls.fan = User.objects.create(username='AAA', password='123')
+        cls.other_fan = User.objects.create(username='CCC', password='123')
+        cls.star = User.objects.create(username='SSS', password='123')
+        cls.author = User.objects.create(username='BBB', password='123')
+
+    def setUp(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        for user in (self.user, self.fan, self.other_fan):
+            Follow.objects.create(user=user, author=self.star)
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def star_entries(self):
+        return TimelineEntry.objects.filter(user=self.user, author=self.star)
+
+    def test_celebrity_posts_are_not_fanned_out(self):
+        '''Посты автора с подписчиками сверх порога не пишутся в ленты.'''
+        Post.objects.create(text='Звезда', author=self.star)
+        self.assertFalse(
+            TimelineEntry.objects.filter(author=self.star).exists())
+
+    def test_feed_merges_pushed_and_pulled_posts(self):
+        '''Лента сливает посты обычных авторов и знаменитостей по дате.'''
+        for text, author in (('1', self.author), ('2', self.star),
+                             ('3', self.author), ('4', self.star)):
+            Post.objects.create(text=text, author=author)
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual([post.text for post in response.context['page']],
+                         ['4', '3', '2', '1'])
+
+    def test_merged_numbered_pages_are_capped(self):
+        '''Номерами листается только начало ленты со «знаменитостями»,
+        дальше с последней номерной страницы ведёт курсор.'''
+        for i in range(5):
+            author = self.star if i % 2 else self.author
+            Post.objects.create(text=str(i), author=author)
+        with mock.patch.object(feeds, 'MERGED_FEED_DEPTH', 3):
+            response = self.authorized_client.get(reverse('follow_index'))
+            page = response.context['page']
+            self.assertEqual(response.context['paginator'].count, 3)
+            self.assertEqual([post.text for post in page], ['4', '3', '2'])
+            response = self.authorized_client.get(
+                reverse('follow_index'), {'cursor': page.next_cursor})
+        self.assertEqual([post.text for post in response.context['page']],
+                         ['1', '0'])
+
+    def test_mode_switches_with_hysteresis(self):
+        '''Автор возвращается в push только ниже нижнего порога, и тогда
+        в ленты раскладываются лишь его последние посты.'''
+        for i in range(3):
+            Post.objects.create(text=f'Звезда {i}', author=self.star)
+        Follow.objects.filter(user=self.fan, author=self.star).delete()
+        self.assertTrue(UserStats.for_user(self.star).feed_pulled)
+        self.assertFalse(self.star_entries().exists())
+        Follow.objects.filter(user=self.other_fan, author=self.star).delete()
+        self.assertFalse(UserStats.for_user(self.star).feed_pulled)
+        self.assertEqual(
+            [entry.post.text for entry in self.star_entries().order_by(
+                '-pub_date', '-post_id')],
+            ['Звезда 2', 'Звезда 1'])
+
+    def test_rebuild_after_threshold_change(self):
+        '''rebuild_timelines переводит авторов на новые пороги и
+        раскладывает посты push-авторов целиком.'''
+        for i in range(3):
+            Post.objects.create(text=f'Звезда {i}', author=self.star)
+        generation = get_generations(author_scope(self.star.pk))
+        with self.settings(FEED_PULL_THRESHOLD=10, FEED_PUSH_THRESHOLD=5):
+            call_command('rebuild_timelines', stdout=StringIO())
+        self.assertFalse(UserStats.for_user(self.star).feed_pulled)
+        self.assertNotEqual(get_generations(author_scope(self.star.pk)),
+                            generation)
+        self.assertEqual(self.star_entries().count(), 3)
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertTrue(UserStats.for_user(self.star).feed_pulled)
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts.models import Post, User
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CollectMediaGarbageTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        user = User.objects.create(username='VVV', password='123')
+        image = SimpleUploadedFile(
+            name='kept.gif', content=SMALL_GIF, content_type='image/gif')
+        self.post = Post.objects.create(text='Текст', author=user,
+                                        image=image)
+        self.orphan = self.make_old_file('posts/00/orphan.gif')
+        self.thumbnail = self.make_old_file('cache/00/00/orphan.jpg')
+        os.utime(self.post.image.path, (0, 0))
+
+    def make_old_file(self, name):
+        path = os.path.join(MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(SMALL_GIF)
+        os.utime(path, (0, 0))
+        return path
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command('collect_media_garbage', '--rate=0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_keeps_files(self):
+        '''Пробный прогон только считает сирот.'''
+        output = self.collect('--dry-run')
+        self.assertIn('Картинок без постов: 1', output)
+        self.assertIn('миниатюр без записей: 1', output)
+        self.assertTrue(os.path.exists(self.orphan))
+        self.assertTrue(os.path.exists(self.thumbnail))
+
+    def test_orphans_are_removed(self):
+        '''Удаляются только файлы, на которые никто не ссылается.'''
+        self.collect()
+        self.assertFalse(os.path.exists(self.orphan))
+        self.assertFalse(os.path.exists(self.thumbnail))
+        self.assertTrue(os.path.exists(self.post.image.path))
+
+    def test_fresh_files_are_kept(self):
+        '''Только что загруженные файлы не трогаем.'''
+        os.utime(self.orphan)
+        self.collect()
+        self.assertTrue(os.path.exists(self.orphan))
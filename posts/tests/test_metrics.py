@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from yatube import metrics
+
+METRICS_DIR = tempfile.mkdtemp()
+
+
+@override_settings(METRICS_DIR=METRICS_DIR, METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='VVV', password='123')
+        Post.objects.create(text='Текст', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        for name in os.listdir(METRICS_DIR):
+            os.remove(os.path.join(METRICS_DIR, name))
+        # Файл процесса удалён, поэтому открываем новый.
+        metrics._values = None
+        self.guest_client = Client()
+
+    def scrape(self):
+        response = self.guest_client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().splitlines()
+
+    def test_requests_are_exported_by_url_name(self):
+        '''Запросы попадают в гистограмму и счётчики по имени URL.'''
+        self.guest_client.get(reverse('index'))
+        self.guest_client.get(reverse('index'))
+        self.guest_client.get(reverse('profile', kwargs={'username': 'nope'}))
+        lines = self.scrape()
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="index",le="+Inf"} 2.0', lines)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="index"} 2.0', lines)
+        self.assertIn(
+            'yatube_requests_total{status="200",view="index"} 2.0', lines)
+        self.assertIn(
+            'yatube_requests_total{status="404",view="profile"} 1.0', lines)
+        self.assertIn('yatube_cache_hit_ratio{view="index"} 0.25', lines)
+        buckets = [float(line.rsplit(' ', 1)[1]) for line in lines
+                   if line.startswith('yatube_request_duration_seconds_'
+                                      'bucket{view="index"')]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertTrue(any(
+            line.startswith('yatube_db_queries_total{view="index"}')
+            for line in lines))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0, SLOW_QUERY_THRESHOLD=0)
+    def test_unsampled_request_is_only_counted(self):
+        '''Вне выборки Server-Timing метрики считают SQL-запросы, но не
+        засекают их время и не проверяют медленные запросы.'''
+        with self.assertNoLogs('yatube.slow_queries', 'WARNING'):
+            self.guest_client.get(reverse('index'))
+        queries = [line for line in self.scrape() if line.startswith(
+            'yatube_db_queries_total{view="index"}')]
+        self.assertEqual(len(queries), 1)
+        self.assertGreater(float(queries[0].rsplit(' ', 1)[1]), 0)
+
+    def test_processes_are_summed(self):
+        '''Значения из файлов разных процессов складываются.'''
+        self.guest_client.get(reverse('index'))
+        other = metrics.ProcessValues(
+            os.path.join(METRICS_DIR, 'metrics_0.db'))
+        other.add(metrics._key('yatube_requests_total',
+                               view='index', status='200'), 4)
+        # Новые ключи не помещаются в начальный размер файла.
+        for number in range(2000):
+            other.add(metrics._key('yatube_requests_total',
+                                   view=f'view{number}', status='200'), 1)
+        self.assertIn(
+            'yatube_requests_total{status="200",view="index"} 5.0',
+            self.scrape())
+
+    def test_request_without_token_is_refused(self):
+        '''Без верного токена метрики не отдаются, в том числе запросам
+        с локального адреса, как у всех запросов через прокси.'''
+        for authorization in ('', 'Bearer wrong', 'Basic secret'):
+            with self.subTest(authorization=authorization):
+                response = self.guest_client.get(
+                    reverse('metrics'), REMOTE_ADDR='127.0.0.1',
+                    HTTP_AUTHORIZATION=authorization)
+                self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_metrics_are_disabled_without_token(self):
+        '''Без настроенного токена /metrics/ выключен.'''
+        response = self.guest_client.get(reverse('metrics'),
+                                         HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 404)
@@ -1,5 +1,6 @@
+from django.db import IntegrityError
 from django.test import TestCase
-from posts.models import Post, Group, User
+from posts.models import Follow, Post, Group, User
 
 
 class PostModelTest(TestCase):
@@ -49,3 +50,10 @@ class PostModelTest(TestCase):
         '''name группы совпадает с ожидаемым.'''
         group = PostModelTest.group
         self.assertEquals(str(group), group.title)
+
+    def test_follow_unique(self):
+        '''Повторная подписка на того же автора запрещена на уровне БД.'''
+        user = User.objects.create(username='SSS', password='123')
+        Follow.objects.create(user=user, author=PostModelTest.post.author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=user, author=PostModelTest.post.author)
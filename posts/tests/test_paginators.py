@@ -0,0 +1,145 @@
+import base64
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.paginators import CursorPaginator, decode_cursor
+from posts.templatetags.pagination import page_window
+from yatube.slow_queries import explain
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='VVV',
+            email='vv@mail.ru',
+            password='123'
+        )
+        for i in range(25):
+            Post.objects.create(text=f'Текст {i}', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_pages_cover_feed_without_gaps(self):
+        '''Курсорные страницы по порядку отдают всю ленту без повторов.'''
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        page = paginator.get_page(None)
+        seen = list(page)
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, list(Post.objects.all()))
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.has_next())
+
+    def test_previous_cursor_returns_previous_page(self):
+        '''Курсор назад возвращает ту же страницу, с которой ушли вперёд.'''
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_cursor_page_starts_at_cursor_in_index(self):
+        '''Страница по курсору читает индекс с позиции курсора, а не от
+        самого нового поста.'''
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        second = paginator.get_page(paginator.get_page(None).next_cursor)
+        for token in (second.next_cursor, second.previous_cursor):
+            queries = []
+
+            def record(execute, sql, params, many, context):
+                queries.append((sql, params))
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(record):
+                paginator.get_page(token)
+            plan = explain(connection, *queries[-1])
+            self.assertRegex(' '.join(plan), r'\(pub_date[<>]\?\)')
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        '''Испорченный токен открывает первую страницу.'''
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+        page = CursorPaginator(Post.objects.all(), 10).get_page('garbage')
+        self.assertEqual(page[0], Post.objects.first())
+
+    def test_foreign_cursor_falls_back_to_first_page(self):
+        '''Курсор с рангом поиска вместо даты не ломает ленты.'''
+        token = base64.urlsafe_b64encode(b'next|1.5|3').decode()
+        for url in (reverse('index'),
+                    reverse('profile', kwargs={'username': 'VVV'})):
+            with self.subTest(url):
+                response = self.guest_client.get(url, {'cursor': token})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['page'][0].text,
+                                 'Текст 24')
+
+    def test_index_follows_next_cursor(self):
+        '''Ссылка «Следующая» на главной ведёт на курсорную страницу.'''
+        response = self.guest_client.get(reverse('index'))
+        next_cursor = response.context['page'].next_cursor
+        self.assertContains(response, f'?cursor={next_cursor}')
+        response = self.guest_client.get(
+            reverse('index'), {'cursor': next_cursor})
+        self.assertEqual(response.context['page'][0].text, 'Текст 14')
+        self.assertEqual(len(response.context['page']), 10)
+
+
+class CachedCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='VVV', password='123')
+        for i in range(25):
+            Post.objects.create(text=f'Текст {i}', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def count_queries(self, page):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(reverse('index'), {'page': page})
+        return response, [query['sql'] for query in queries
+                          if 'COUNT(' in query['sql']]
+
+    def test_count_is_cached_per_generation(self):
+        '''COUNT(*) ленты выполняется раз на поколение, а не на каждой
+        странице.'''
+        response, counts = self.count_queries(1)
+        self.assertEqual(len(counts), 1)
+        self.assertEqual(type(response.context['paginator']), Paginator)
+        self.assertEqual(response.context['paginator'].count, 25)
+        _, counts = self.count_queries(2)
+        self.assertEqual(counts, [])
+        Post.objects.create(text='Новый', author=self.user)
+        response, counts = self.count_queries(3)
+        self.assertEqual(len(counts), 1)
+        self.assertEqual(response.context['paginator'].count, 26)
+
+
+class PageWindowTests(SimpleTestCase):
+    def window(self, number, count=100):
+        paginator = Paginator(range(count), 1)
+        return page_window(paginator, paginator.page(number))
+
+    def test_window_is_elided(self):
+        '''Выводятся края и окно вокруг текущей страницы.'''
+        self.assertEqual(self.window(50), [1, None, 48, 49, 50, 51, 52,
+                                           None, 100])
+        self.assertEqual(self.window(1), [1, 2, 3, None, 100])
+        self.assertEqual(self.window(4), [1, 2, 3, 4, 5, 6, None, 100])
+
+    def test_short_feed_is_not_elided(self):
+        '''Короткая лента выводит все страницы.'''
+        self.assertEqual(self.window(3, count=7), [1, 2, 3, 4, 5, 6, 7])
@@ -0,0 +1,77 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import Client, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from yatube import profiling
+
+PROFILE_DIR = tempfile.mkdtemp()
+
+
+def slow_response(handler, request):
+    # Запрос должен прожить несколько интервалов семплирования.
+    request.resolver_match = resolve(request.path_info)
+    time.sleep(0.2)
+    return HttpResponse()
+
+
+@override_settings(PROFILE_DIR=PROFILE_DIR, PROFILE_SAMPLE_RATE=0,
+                   PROFILE_SLOW_THRESHOLD=60, PROFILE_INTERVAL=0.001)
+class ProfilingTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(PROFILE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        for name in os.listdir(PROFILE_DIR):
+            os.remove(os.path.join(PROFILE_DIR, name))
+        self.guest_client = Client()
+
+    def dumps(self):
+        return sorted(os.listdir(PROFILE_DIR))
+
+    def test_signed_trigger_dumps_profile(self):
+        '''Запрос с подписанным параметром профилируется и сохраняется,
+        поддельный или выданный для другого пути параметр — нет.'''
+        url = reverse('follow_index')
+        self.guest_client.get(url, {'_profile': 'подделка'})
+        self.guest_client.get(
+            url, {'_profile': profiling.trigger_token(reverse('index'))})
+        self.assertEqual(self.dumps(), [])
+        self.guest_client.get(url, {'_profile': profiling.trigger_token(url)})
+        dumps = self.dumps()
+        self.assertEqual(len(dumps), 1)
+        with open(os.path.join(PROFILE_DIR, dumps[0])) as dump:
+            profile = json.load(dump)
+        self.assertEqual(profile['view'], 'follow_index')
+        self.assertTrue(profile['triggered'])
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_SLOW_THRESHOLD=0.1)
+    def test_slow_requests_are_dumped_and_collapsed(self):
+        '''Из семплированных запросов сохраняются только медленные, а
+        команда сводит их стеки в свёрнутый формат.'''
+        self.guest_client.get(reverse('index'))
+        # Цепочка middleware собирается при первом запросе клиента, поэтому
+        # медленный обработчик получает новый клиент.
+        with mock.patch('django.core.handlers.base.BaseHandler._get_response',
+                        slow_response):
+            Client().get(reverse('index'))
+        self.assertEqual(len(self.dumps()), 1)
+        stdout = StringIO()
+        call_command('collapse_profiles', stdout=stdout, stderr=StringIO())
+        lines = stdout.getvalue().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith('index;'))
+            self.assertGreater(int(count), 0)
+        self.assertTrue(any('slow_response' in line for line in lines))
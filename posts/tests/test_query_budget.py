@@ -0,0 +1,84 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class QueryBudgetTests(TestCase):
+    '''Число SQL-запросов ленты не должно расти вместе с числом постов
+    на странице и не должно превышать отведённый бюджет.'''
+
+    # Сессия и пользователь — 2 запроса на авторизованный клиент,
+    # ETag профиля (posts.conditional) — ещё 1.
+    budgets = {
+        'index': 4,
+        'group': 5,
+        'profile': 8,
+        'follow_index': 6,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='VVV',
+            email='vv@mail.ru',
+            password='123'
+        )
+        cls.author = User.objects.create(
+            username='SSS',
+            email='ss@mail.ru',
+            password='123'
+        )
+        cls.group = Group.objects.create(
+            title='cat',
+            slug='cat',
+            description='Test description',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def add_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                text=f'Текст {i}', author=self.author, group=self.group)
+            Comment.objects.create(post=post, author=self.user, text='Да')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # SAVEPOINT/RELEASE от ATOMIC_REQUESTS — не запросы к данным.
+        return len([query for query in queries
+                    if 'SAVEPOINT' not in query['sql']])
+
+    def assertQueryBudget(self, name, url):
+        self.add_posts(1)
+        small = self.count_queries(url)
+        self.add_posts(9)
+        full = self.count_queries(url)
+        self.assertEqual(small, full,
+                         f'{name}: число запросов растёт с числом постов')
+        self.assertLessEqual(full, self.budgets[name],
+                             f'{name}: превышен бюджет запросов')
+
+    def test_index_query_budget(self):
+        self.assertQueryBudget('index', reverse('index'))
+
+    def test_group_query_budget(self):
+        self.assertQueryBudget(
+            'group', reverse('group', kwargs={'slug': 'cat'}))
+
+    def test_profile_query_budget(self):
+        self.assertQueryBudget(
+            'profile', reverse('profile', kwargs={'username': 'SSS'}))
+
+    def test_follow_index_query_budget(self):
+        self.assertQueryBudget('follow_index', reverse('follow_index'))
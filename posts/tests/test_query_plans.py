@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from yatube.slow_queries import explain, plan_problems
+
+AUTHORS = 12
+GROUPS = 4
+POSTS_PER_AUTHOR = 15
+
+
+class QueryPlanTests(TestCase):
+    '''Каждый запрос горячих страниц идёт по индексу: без полного
+    просмотра таблицы и без сортировки во временном B-дереве.'''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='reader', password='123')
+        groups = [Group.objects.create(title=f'Группа {i}', slug=f'group{i}',
+                                       description='Описание')
+                  for i in range(GROUPS)]
+        cls.authors = [User.objects.create(username=f'author{i}',
+                                           password='123')
+                       for i in range(AUTHORS)]
+        for number, author in enumerate(cls.authors):
+            if number % 2:
+                Follow.objects.create(user=cls.user, author=author)
+            for i in range(POSTS_PER_AUTHOR):
+                post = Post.objects.create(
+                    text=f'Пост {i} автора {number}', author=author,
+                    group=groups[i % GROUPS] if i % 3 else None)
+                if i % 4 == 0:
+                    Comment.objects.create(post=post, author=cls.user,
+                                           text='Комментарий')
+        cls.post = post
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def capture(self, method, url):
+        '''Запросы, выполненные при обращении к url: (sql, params).'''
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            if not many:
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        cache.clear()
+        with connection.execute_wrapper(record):
+            response = getattr(self.authorized_client, method)(url)
+        self.assertLess(response.status_code, 400)
+        return [(sql, params) for sql, params in queries
+                if 'SAVEPOINT' not in sql]
+
+    def assertIndexedPlans(self, method, url):
+        queries = self.capture(method, url)
+        self.assertTrue(queries)
+        for sql, params in queries:
+            plan = explain(connection, sql, params)
+            problems = plan_problems(plan, sql)
+            self.assertFalse(problems, f'{url}: {sql}\n{plan}')
+
+    def hot_pages(self):
+        author = self.post.author.username
+        return {
+            'index': reverse('index'),
+            'group': reverse('group', kwargs={'slug': 'group1'}),
+            'profile': reverse('profile', kwargs={'username': author}),
+            'follow_index': reverse('follow_index'),
+        }
+
+    def test_hot_pages_use_indexes(self):
+        author = self.post.author.username
+        pages = {
+            **self.hot_pages(),
+            'post': reverse('post', kwargs={'username': author,
+                                            'post_id': self.post.pk}),
+        }
+        for name, url in pages.items():
+            with self.subTest(name):
+                self.assertIndexedPlans('get', url)
+
+    def test_deep_pages_use_indexes(self):
+        '''Глубокие страницы, по номеру и по курсору в обе стороны, тоже
+        идут по индексу с позиции страницы.'''
+        for name, url in self.hot_pages().items():
+            response = self.authorized_client.get(url, {'page': 2})
+            page = response.context['page']
+            pages = {
+                'page': f'{url}?page={page.paginator.num_pages}',
+                'next': f'{url}?cursor={page.next_cursor}',
+                'prev': f'{url}?cursor={page.previous_cursor}',
+            }
+            for kind, page_url in pages.items():
+                with self.subTest(name, page=kind):
+                    self.assertIndexedPlans('get', page_url)
+
+    @override_settings(FEED_PULL_THRESHOLD=1, FEED_PUSH_THRESHOLD=1)
+    def test_celebrity_feed_uses_indexes(self):
+        '''Посты «знаменитостей» лента читает из Post, тоже по индексу.'''
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertIndexedPlans('get', reverse('follow_index'))
+
+    def test_follow_actions_use_indexes(self):
+        author = self.authors[0].username
+        for name in ('profile_follow', 'profile_unfollow'):
+            with self.subTest(name):
+                self.assertIndexedPlans(
+                    'get', reverse(name, kwargs={'username': author}))
@@ -0,0 +1,73 @@
+from django.contrib.admin.sites import site
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Post, User
+from posts.paginators import POSTS_PER_PAGE
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='VVV', password='123')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query, **params):
+        response = self.guest_client.get(reverse('search'),
+                                          {'q': query, **params})
+        return response, list(response.context['page'])
+
+    def test_post_text_ranks_above_comment(self):
+        '''Совпадение в тексте поста выше совпадения в комментарии.'''
+        by_comment = Post.objects.create(text='Про собак', author=self.user)
+        Comment.objects.create(post=by_comment, author=self.user,
+                               text='А у меня котёнок')
+        by_text = Post.objects.create(text='Мой котёнок спит',
+                                      author=self.user)
+        Post.objects.create(text='Ничего общего', author=self.user)
+        _, found = self.search('Котёнок')
+        self.assertEqual(found, [by_text, by_comment])
+
+    def test_index_follows_writes(self):
+        '''Индекс следует за правкой и удалением постов.'''
+        post = Post.objects.create(text='Старый текст', author=self.user)
+        Post.objects.filter(pk=post.pk).update(text='Новый текст')
+        self.assertEqual(self.search('старый')[1], [])
+        self.assertEqual(self.search('новый')[1], [post])
+        post.delete()
+        self.assertEqual(self.search('новый')[1], [])
+
+    def test_prefix_and_operators(self):
+        '''Последнее слово ищется как префикс, а синтаксис FTS5 из ввода
+        не ломает запрос.'''
+        post = Post.objects.create(text='Программирование', author=self.user)
+        self.assertEqual(self.search('програм')[1], [post])
+        response, found = self.search('"AND (*')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(found, [])
+
+    def test_cursor_pagination(self):
+        '''Результаты листаются курсором без повторов и пропусков.'''
+        posts = {Post.objects.create(text=f'Кот номер {i}', author=self.user)
+                 for i in range(POSTS_PER_PAGE + 2)}
+        response, first = self.search('кот')
+        cursor = response.context['page'].next_cursor
+        response, second = self.search('кот', cursor=cursor)
+        self.assertEqual(len(first), POSTS_PER_PAGE)
+        self.assertEqual(set(first) | set(second), posts)
+        self.assertFalse(response.context['page'].has_next())
+        previous = response.context['page'].previous_cursor
+        self.assertEqual(self.search('кот', cursor=previous)[1], first)
+
+    def test_admin_uses_index(self):
+        '''Поиск в админке идёт по индексу.'''
+        post = Post.objects.create(text='Админский пост', author=self.user)
+        Post.objects.create(text='Другой', author=self.user)
+        model_admin = site._registry[Post]
+        request = RequestFactory().get('/admin/posts/post/')
+        found, _ = model_admin.get_search_results(
+            request, Post.objects.all(), 'админский')
+        self.assertEqual(list(found), [post])
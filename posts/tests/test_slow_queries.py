@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from yatube.slow_queries import normalize
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='VVV', password='123')
+        cls.post = Post.objects.create(text='Текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_normalize(self):
+        '''Запросы, различающиеся только значениями, имеют одну форму.'''
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE id IN (%s, %s)  AND x = 'a'"),
+            normalize('SELECT * FROM t WHERE id IN (%s, %s, %s) AND x = 5'))
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0, SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_slow_queries_are_logged_and_reported(self):
+        '''Медленный запрос пишется с планом, представлением и шаблоном,
+        а отчёт группирует его по форме.'''
+        with self.assertLogs('yatube.slow_queries', 'WARNING') as logs:
+            self.guest_client.get(reverse('post', kwargs={
+                'username': 'VVV', 'post_id': self.post.pk}))
+        entries = [json.loads(record.getMessage())
+                   for record in logs.records]
+        self.assertTrue(all(entry['view'] == 'post' for entry in entries))
+        self.assertTrue(all(entry['plan'] for entry in entries
+                            if entry['shape'].startswith('SELECT')))
+        self.assertFalse(any('params' in entry or 'sql' in entry
+                             for entry in entries))
+        self.assertIn('includes/comments.html',
+                      {entry['template'] for entry in entries})
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.log', delete=False) as log:
+            log.write('\n'.join(record.getMessage()
+                                for record in logs.records * 2))
+        self.addCleanup(os.remove, log.name)
+        stdout = StringIO()
+        call_command('slow_query_report', log.name, stdout=stdout)
+        report = stdout.getvalue()
+        self.assertIn('2 раз', report)
+        self.assertIn('Представления: post (2)', report)
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TransactionTestCase, override_settings
+
+from posts.models import Post, User
+from posts.storage import ContentAddressedStorage
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+# Файлы удаляются в on_commit, поэтому нужны настоящие коммиты.
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ContentAddressedStorageTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create(username='VVV', password='123')
+
+    def create_post(self, name):
+        image = SimpleUploadedFile(
+            name=name, content=SMALL_GIF, content_type='image/gif')
+        return Post.objects.create(text='Текст', author=self.user,
+                                   image=image)
+
+    def test_identical_images_share_one_file(self):
+        '''Одинаковые картинки хранятся одним файлом с именем по хэшу.'''
+        first = self.create_post('one.gif')
+        second = self.create_post('two.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name,
+                         r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+
+    def test_file_is_removed_with_last_reference(self):
+        '''Файл удаляется только вместе с последним постом.'''
+        first = self.create_post('one.gif')
+        second = self.create_post('two.gif')
+        storage, name = first.image.storage, first.image.name
+        os.utime(storage.path(name), (0, 0))
+        first.delete()
+        self.assertTrue(storage.exists(name))
+        second.delete()
+        self.assertFalse(storage.exists(name))
+
+    def test_reuploaded_file_is_kept(self):
+        '''Файл, который только что загрузили ещё раз, не удаляется
+        вместе с последним закоммиченным постом: пост с повторной
+        загрузкой мог ещё не закоммититься.'''
+        post = self.create_post('one.gif')
+        storage, name = post.image.storage, post.image.name
+        os.utime(storage.path(name), (0, 0))
+        storage.save('posts/two.gif', SimpleUploadedFile(
+            'two.gif', SMALL_GIF, content_type='image/gif'))
+        post.delete()
+        self.assertTrue(storage.exists(name))
+
+    def test_concurrent_identical_upload(self):
+        '''Если такой же файл записали между проверкой и созданием файла,
+        сохранение возвращает его имя, а не повторяет попытки вечно.'''
+        name = self.create_post('one.gif').image.name
+        storage = Post._meta.get_field('image').storage
+        # Проверка «не видит» файл один раз, как при гонке двух загрузок.
+        with mock.patch.object(ContentAddressedStorage, '_touch',
+                               side_effect=[False, True]):
+            saved = storage.save('posts/two.gif', SimpleUploadedFile(
+                'two.gif', SMALL_GIF, content_type='image/gif'))
+        self.assertEqual(saved, name)
@@ -0,0 +1,124 @@
+from io import BytesIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail.parsers import parse_geometry
+
+from posts import thumbnails
+from posts.cache import card_cache_stats
+from posts.models import Post, User
+from posts.thumbnail_engine import Engine
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='VVV', password='123')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        image = SimpleUploadedFile(
+            name='thumb.gif', content=SMALL_GIF, content_type='image/gif')
+        self.post = Post.objects.create(
+            text='Текст', author=self.user, image=image)
+
+    def get_profile(self):
+        return self.guest_client.get(
+            reverse('profile', kwargs={'username': 'VVV'}))
+
+    def ready_thumbnail(self, variant='card'):
+        return thumbnails.lookup_thumbnails(
+            [self.post.image], [variant])[self.post.image.name][variant]
+
+    def test_page_falls_back_to_original_image(self):
+        '''Пока миниатюры нет, страница показывает исходную картинку и не
+        строит миниатюру сама.'''
+        response = self.get_profile()
+        self.assertContains(response, self.post.image.url)
+        self.assertIsNone(self.ready_thumbnail())
+
+    def test_pending_card_is_not_cached(self):
+        '''Карточка с запасной картинкой не попадает в кэш.'''
+        self.get_profile()
+        before = card_cache_stats()
+        self.get_profile()
+        self.assertEqual(card_cache_stats()['hits'], before['hits'])
+
+    def test_generated_thumbnail_is_shown(self):
+        '''После построения страница показывает миниатюру.'''
+        thumbnails._submit(self.post.image.name, self.post.author_id,
+                           self.post.group_id)
+        thumbnail = self.ready_thumbnail()
+        self.assertIsNotNone(thumbnail)
+        self.assertContains(self.get_profile(), thumbnail.url)
+
+    def test_card_has_webp_and_jpeg_srcset(self):
+        '''Карточка отдаёт набор ширин в WebP и JPEG.'''
+        thumbnails._submit(self.post.image.name, self.post.author_id,
+                           self.post.group_id)
+        response = self.get_profile()
+        for width in thumbnails.CARD_WIDTHS:
+            for format_ in ('webp', 'jpeg'):
+                with self.subTest(width=width, format=format_):
+                    thumbnail = self.ready_thumbnail(
+                        f'card-{width}-{format_}')
+                    self.assertEqual(thumbnail.width, width)
+                    self.assertContains(response, f'{thumbnail.url} {width}w')
+        self.assertContains(response, 'type="image/webp"')
+
+    def test_failed_image_is_not_resubmitted(self):
+        '''Картинку, миниатюры которой не построились, показ страницы
+        не отправляет в пул снова до истечения таймаута.'''
+        with mock.patch.object(thumbnails, '_generate',
+                               side_effect=OSError) as generate:
+            with self.assertLogs('posts.thumbnails', 'ERROR'):
+                thumbnails._submit(self.post.image.name,
+                                   self.post.author_id, self.post.group_id)
+            self.assertContains(self.get_profile(), self.post.image.url)
+            thumbnails._submit(self.post.image.name, self.post.author_id,
+                               self.post.group_id)
+        self.assertEqual(generate.call_count, 1)
+
+    def test_page_thumbnails_are_fetched_in_one_query(self):
+        '''Миниатюры всей страницы читаются одним запросом к KV-таблице.'''
+        for _ in range(3):
+            Post.objects.create(text='Ещё', author=self.user,
+                                image=self.post.image.name)
+        cache.clear()
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(1):
+            found = thumbnails.prefetch_thumbnails(posts)
+        self.assertEqual(list(found), [self.post.image.name])
+        self.assertEqual(set(found[self.post.image.name].values()), {None})
+
+
+class DraftEngineTests(TestCase):
+    def test_jpeg_is_decoded_at_reduced_scale(self):
+        '''Большой JPEG декодируется уменьшенным, а размер миниатюры тот
+        же, что у стандартного движка.'''
+        raw = BytesIO()
+        Image.new('RGB', (4000, 3000), 'red').save(raw, 'JPEG')
+        engine = Engine()
+        image = engine.get_image(BytesIO(raw.getvalue()))
+        options = {'crop': 'center', 'upscale': True, 'cropbox': None,
+                   'colorspace': 'RGB', 'rounded': None, 'format': 'JPEG'}
+        geometry = parse_geometry('960x339', 4000 / 3000)
+        thumbnail = engine.create(image, geometry, options)
+        self.assertEqual(image.size, (2000, 1500))
+        self.assertEqual(thumbnail.size, (960, 339))
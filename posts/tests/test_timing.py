@@ -0,0 +1,37 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='VVV', password='123')
+        Post.objects.create(text='Текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_sampled_request_has_header_and_log(self):
+        '''Замеренный запрос отдаёт Server-Timing и пишет строку в лог.'''
+        url = reverse('profile', kwargs={'username': 'VVV'})
+        with self.assertLogs('yatube.timing', 'INFO') as logs:
+            response = self.guest_client.get(url)
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'thumb;dur=', 'total;dur='):
+            self.assertIn(metric, header)
+        self.assertIn('0 hits, 2 misses', header)
+        self.assertIn('"view": "profile"', logs.output[0])
+        response = self.guest_client.get(url)
+        self.assertIn('2 hits, 0 misses', response['Server-Timing'])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request_is_not_measured(self):
+        '''Запрос вне выборки не замеряется.'''
+        response = self.guest_client.get(reverse('index'))
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,42 @@
+'''PIL-движок sorl-thumbnail, который не декодирует большие фотографии
+в полном разрешении.
+
+JPEG декодируется сразу в уменьшенном в 2, 4 или 8 раз виде (draft), а
+остальные форматы перед точным ресайзом грубо уменьшаются целым
+множителем (reduce). Итоговый размер миниатюры тот же, что у
+стандартного движка.
+'''
+import math
+
+from PIL import Image
+from sorl.thumbnail.engines import pil_engine
+
+# Во сколько раз промежуточная картинка должна быть больше итоговой,
+# чтобы грубое уменьшение не было заметно после LANCZOS. То же значение
+# Pillow использует в Image.thumbnail.
+REDUCING_GAP = 2.0
+
+
+class Engine(pil_engine.Engine):
+    def create(self, image, geometry, options):
+        self._draft(image, geometry, options)
+        return super().create(image, geometry, options)
+
+    def _draft(self, image, geometry, options):
+        # cropbox и remove_border работают в координатах исходника.
+        if image.format != 'JPEG' or options['cropbox'] or options.get(
+                'remove_border'):
+            return
+        x_image, y_image = image.size
+        if self.flip_dimensions(image, geometry, options):
+            x_image, y_image = y_image, x_image
+        factor = REDUCING_GAP * self._calculate_scaling_factor(
+            x_image, y_image, geometry, options)
+        # draft выбирает наименьший масштаб не меньше запрошенного.
+        if factor < 1:
+            image.draft(image.mode, (math.ceil(image.size[0] * factor),
+                                     math.ceil(image.size[1] * factor)))
+
+    def _scale(self, image, width, height):
+        return image.resize((width, height), resample=Image.LANCZOS,
+                            reducing_gap=REDUCING_GAP)
@@ -0,0 +1,258 @@
+'''Фоновая подготовка миниатюр Post.image.
+
+Миниатюры для всех геометрий, которые используют шаблоны, строятся в
+пуле процессов после сохранения поста, а не при первом показе страницы.
+Пока миниатюры нет, шаблон показывает исходную картинку.
+'''
+import logging
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from yatube import timing
+
+from .cache import bump_post_generations
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Карточка поста: исходный формат для <img> и набор ширин в WebP и JPEG
+# для srcset, чтобы телефоны не скачивали картинку шириной 960.
+CARD_WIDTH, CARD_HEIGHT = 960, 339
+CARD_WIDTHS = (480, 720, 960)
+CARD_FORMATS = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+CARD_SIZES = f'(max-width: {CARD_WIDTH}px) 100vw, {CARD_WIDTH}px'
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+
+
+def _card_variant(width, format_):
+    return f'card-{width}-{format_.lower()}'
+
+
+# Геометрии, в которых шаблоны показывают Post.image.
+POST_THUMBNAILS = {
+    'card': (f'{CARD_WIDTH}x{CARD_HEIGHT}', CARD_OPTIONS),
+    **{_card_variant(width, format_): (
+        f'{width}x{round(width * CARD_HEIGHT / CARD_WIDTH)}',
+        {**CARD_OPTIONS, 'format': format_})
+       for width in CARD_WIDTHS for format_ in CARD_FORMATS},
+}
+
+# Картинку, миниатюры которой построить не удалось, столько секунд не
+# ставим в очередь снова: иначе её отправлял бы в пул каждый показ страницы.
+FAILED_RETRY_TIMEOUT = 60 * 60
+
+# Картинки моложе стольких секунд release_image не удаляет.
+RELEASE_MIN_AGE = 60 * 60
+
+_executor = None
+_pending = set()
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    def get_thumbnail_file(self, file_, geometry_string, **options):
+        '''ImageFile миниатюры с тем же именем, что дал бы get_thumbnail,
+        но без чтения и генерации картинки.'''
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+
+class CardImage:
+    '''Готовые миниатюры карточки поста для элемента <picture>.'''
+    sizes = CARD_SIZES
+
+    def __init__(self, thumbnails):
+        self.thumbnails = thumbnails
+
+    @property
+    def src(self):
+        return self.thumbnails['card'].url
+
+    @property
+    def sources(self):
+        return [
+            {'type': mime_type,
+             'srcset': ', '.join(
+                 f'{self.thumbnails[_card_variant(width, format_)].url} '
+                 f'{width}w' for width in CARD_WIDTHS)}
+            for format_, mime_type in CARD_FORMATS.items()
+        ]
+
+
+@timing.timed('thumbnails')
+def lookup_thumbnails(images, variants=POST_THUMBNAILS):
+    '''Готовые миниатюры картинок из KV-хранилища sorl:
+    {имя исходного файла: {вариант: миниатюра или None}}.
+
+    Для cached_db все ключи читаются одним get_many из кэша и одним
+    запросом к таблице sorl вместо отдельного поиска на каждую картинку.
+    Промахи не кэшируются: миниатюру строит другой процесс, и кэш этого
+    процесса иначе не увидел бы её до истечения таймаута.
+    '''
+    files = {}
+    for image in images:
+        if not image:
+            continue
+        for variant in variants:
+            geometry, options = POST_THUMBNAILS[variant]
+            files[image.name, variant] = (
+                default.backend.get_thumbnail_file(
+                    image, geometry, **options))
+    kvstore = default.kvstore
+    result = {}
+    if not isinstance(kvstore, CachedDBKVStore):
+        for (name, variant), thumbnail in files.items():
+            result.setdefault(name, {})[variant] = kvstore.get(thumbnail)
+        return result
+    keys = {pair: add_prefix(thumbnail.key)
+            for pair, thumbnail in files.items()}
+    found = kvstore.cache.get_many(list(keys.values()))
+    missing = [key for key in keys.values()
+               if found.get(key, EMPTY_VALUE) == EMPTY_VALUE]
+    if missing:
+        stored = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        kvstore.cache.set_many(
+            stored, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        found.update(stored)
+    for (name, variant), key in keys.items():
+        value = found.get(key, EMPTY_VALUE)
+        result.setdefault(name, {})[variant] = (
+            deserialize_image_file(value) if value != EMPTY_VALUE else None)
+    return result
+
+
+def card_image(thumbnails):
+    '''CardImage, если готовы все миниатюры карточки, иначе None.'''
+    if not thumbnails or None in thumbnails.values():
+        return None
+    return CardImage(thumbnails)
+
+
+def prefetch_thumbnails(posts):
+    '''Миниатюры всех картинок страницы для тега post_thumbnail.'''
+    return lookup_thumbnails([post.image for post in posts])
+
+
+def _init_worker():
+    # Соединения родителя нельзя использовать после fork.
+    for connection in connections.all():
+        connection.close()
+
+
+def _source(name):
+    # Ключи sorl зависят от хранилища, поэтому берём то же, что у поля.
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def _generate(name):
+    source = _source(name)
+    for geometry, options in POST_THUMBNAILS.values():
+        default.backend.get_thumbnail(source, geometry, **options)
+    return name
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS, initializer=_init_worker)
+    return _executor
+
+
+def _failed_key(name):
+    return f'thumbnail_failed:{name}'
+
+
+def _done(name, author_id, group_id):
+    def callback(future):
+        _pending.discard(name)
+        if future.exception() is not None:
+            logger.error('Не удалось построить миниатюры для %s', name,
+                         exc_info=future.exception())
+            cache.set(_failed_key(name), True, FAILED_RETRY_TIMEOUT)
+            return
+        # Страницы с запасной картинкой пора пересобрать.
+        bump_post_generations(author_id, group_id)
+    return callback
+
+
+def _submit(name, author_id, group_id):
+    # Повторно загруженная картинка уже лежит под тем же именем вместе
+    # с миниатюрами.
+    if name in _pending or cache.get(_failed_key(name)) or card_image(
+            lookup_thumbnails([_source(name)])[name]):
+        return
+    _pending.add(name)
+    if settings.THUMBNAIL_WORKERS:
+        future = _get_executor().submit(_generate, name)
+    else:
+        future = Future()
+        try:
+            with timing.timer('thumbnails'):
+                future.set_result(_generate(name))
+        except Exception as error:
+            future.set_exception(error)
+    future.add_done_callback(_done(name, author_id, group_id))
+
+
+def enqueue(post):
+    '''Ставит в очередь миниатюры картинки поста после коммита.'''
+    if not post.image:
+        return
+    transaction.on_commit(
+        lambda: _submit(post.image.name, post.author_id, post.group_id))
+
+
+def _recently_used(storage, name, min_age):
+    try:
+        modified = storage.get_modified_time(name)
+    except FileNotFoundError:
+        return False
+    return (timezone.now() - modified).total_seconds() < min_age
+
+
+def release_image(name, min_age=RELEASE_MIN_AGE):
+    '''Удаляет файл картинки и его миниатюры, если на него больше не
+    ссылается ни один пост. Возвращает True, если файл удалён.
+
+    Файл, изменённый меньше min_age секунд назад, остаётся: такой же
+    файл могли только что загрузить в пост, который ещё не закоммичен, и
+    проверка ссылок его не видит (хранилище обновляет время файла при
+    повторной загрузке). Его потом удалит collect_media_garbage.
+    '''
+    if not name or Post.objects.filter(image=name).exists():
+        return False
+    source = _source(name)
+    try:
+        if _recently_used(source.storage, name, min_age):
+            return False
+        default.kvstore.delete(source)
+        source.delete()
+    except SuspiciousFileOperation:
+        # Путь вне MEDIA_ROOT: такой файл хранилищу не принадлежит.
+        logger.warning('Картинка %s вне хранилища, не удаляем', name)
+        return False
+    return True
@@ -1,34 +1,50 @@
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
-from django.core.paginator import Paginator
 
+from . import thumbnails
+from .cache import (FEED, FOLLOW_PAGES_PER_USER, GROUPS, author_scope,
+                    cache_by_generation, follow_scope, get_group,
+                    group_scope)
+from .conditional import (group_condition, index_condition,
+                          post_condition, profile_condition)
+from .feeds import FollowFeed
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
+from .models import Post, User, Follow, UserStats
+from .paginators import POSTS_PER_PAGE, CursorPaginator, paginate
+from .search import SearchResults, parse_rank, search_values
+from .thumbnails import prefetch_thumbnails
 
 
-@cache_page(20)
+@index_condition
+@cache_by_generation(lambda request: [FEED])
 def index(request):
-    posts = Post.objects.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = Post.objects.for_feed()
+    paginator, page = paginate(request, posts, count_scopes=[FEED])
     return render(
         request,
         'index.html',
-        {'page': page, 'paginator': paginator}
+        {'page': page, 'paginator': paginator,
+         'thumbnails': prefetch_thumbnails(page)}
     )
 
 
+@group_condition
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()[:12]
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'group.html', {'group': group, 'posts': posts,
-                                          'page': page,
-                                          'paginator': paginator})
+    group = get_group(slug)
+    if group is None:
+        raise Http404
+    posts = group.posts.for_feed()
+    paginator, page = paginate(request, posts,
+                               count_scopes=[group_scope(group.pk)])
+    context = {'group': group,
+               'posts': posts,
+               'page': page,
+               'paginator': paginator,
+               'thumbnails': prefetch_thumbnails(page),
+               }
+    return render(request, 'group.html', context)
 
 
 @login_required
@@ -39,30 +55,34 @@ def new_post(request):
         new_form = form.save(commit=False)
         new_form.author = request.user
         new_form.save()
+        thumbnails.enqueue(new_form)
         return redirect('index')
     return render(request, 'new.html', {'form': form})
 
 
+@profile_condition
 def profile(request, username):
     profile = get_object_or_404(User, username=username)
-    posts = profile.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    following = profile.following.all()
-    follows = profile.follower.count()
-    followers = profile.following.count()
+    posts = profile.posts.for_feed()
+    paginator, page = paginate(request, posts,
+                               count_scopes=[author_scope(profile.pk)])
+    stats = UserStats.for_user(profile)
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author=profile).exists()
     context = {'page': page,
                'paginator': paginator,
+               'thumbnails': prefetch_thumbnails(page),
                'post': posts,
                'profile': profile,
-               'followers': followers,
+               'stats': stats,
+               'followers': stats.followers_count,
                'following': following,
-               'follows': follows,
+               'follows': stats.following_count,
                }
     return render(request, 'includes/profile.html', context)
 
 
+@post_condition
 def post_view(request, username, post_id):
     post = get_object_or_404(Post, author__username=username, id=post_id)
     name = post.author
@@ -73,6 +93,7 @@ def post_view(request, username, post_id):
 
     return render(request, "post.html", {"post": post,
                                          "profile": name,
+                                         "stats": UserStats.for_user(name),
                                          "comments": comments,
                                          "form": form})
 
@@ -85,7 +106,7 @@ def post_edit(request, username, post_id):
     form = PostForm(request.POST or None,
                     files=request.FILES or None, instance=post)
     if form.is_valid():
-        form.save()
+        thumbnails.enqueue(form.save())
         return redirect('post', username=name, post_id=post_id)
     context = {'post': post,
                'profile': name,
@@ -110,31 +131,50 @@ def add_comment(request, username, post_id):
     return redirect('post', username, post_id)
 
 
+def follow_feed_scopes(request):
+    '''Лента подписок устаревает при смене подписок, при любой записи
+    любого из авторов, на которых подписан пользователь, и при правке
+    любой группы, название которой видно в карточках. Нужны и кэшу
+    страницы, и счётчику постов, поэтому считаются раз на запрос.'''
+    if not hasattr(request, '_follow_feed_scopes'):
+        authors = Follow.objects.filter(user=request.user).values_list(
+            'author_id', flat=True)
+        request._follow_feed_scopes = [follow_scope(request.user.pk),
+                                       GROUPS, *map(author_scope, authors)]
+    return request._follow_feed_scopes
+
+
 @login_required
+@cache_by_generation(follow_feed_scopes,
+                     per_user_limit=FOLLOW_PAGES_PER_USER)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, "follow.html", {'page': page, 'paginator': paginator})
+    paginator, page = paginate(request, FollowFeed(request.user),
+                               count_scopes=follow_feed_scopes(request))
+    return render(request, "follow.html", {
+        'page': page,
+        'paginator': paginator,
+        'thumbnails': prefetch_thumbnails(page),
+    })
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    follow = Follow.objects.filter(user=request.user, author=author).exists()
-    if not follow and author != request.user:
-        Follow.objects.create(user=request.user, author=author)
+    if author != request.user:
+        # Повторную подписку отсекает unique_follow: один INSERT вместо
+        # гонки между exists() и create().
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=request.user, author=author)
+        except IntegrityError:
+            pass
     return redirect('profile', username)
 
 
-
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    follow = Follow.objects.filter(user=request.user, author=author)
-    if follow.exists():
-        follow.delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('profile', username)
 
 
@@ -149,3 +189,16 @@ def page_not_found(request, exception):
 
 def server_error(request):
     return render(request, "misc/500.html", status=500)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = CursorPaginator(SearchResults(query), POSTS_PER_PAGE,
+                                key=search_values, parse=parse_rank)
+    page = paginator.get_page(request.GET.get('cursor'))
+    return render(request, 'search.html', {
+        'query': query,
+        'page': page,
+        'paginator': paginator,
+        'thumbnails': prefetch_thumbnails(page),
+    })
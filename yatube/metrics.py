@@ -0,0 +1,286 @@
+'''Метрики в формате Prometheus: гистограммы задержки по имени URL, число
+запросов по статусам, число SQL-запросов и попадания в кэш.
+
+Каждый процесс пишет свои значения в собственный файл в METRICS_DIR через
+mmap: запрос берёт блокировку процесса один раз, чтобы прибавить несколько
+чисел, а между процессами блокировок нет вовсе. Представление metrics
+читает все файлы каталога и складывает значения, поэтому неважно, какой
+воркер ответит на запрос сборщика. Каталог стоит очищать при выкладке:
+файлы завершённых процессов продолжают учитываться.
+'''
+import glob
+import hmac
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from . import timing
+
+# Границы корзин гистограммы задержки, в секундах.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, float('inf'))
+
+METRICS = {
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа по имени URL'),
+    'yatube_requests_total': (
+        'counter', 'Число ответов по имени URL и статусу'),
+    'yatube_db_queries_total': (
+        'counter', 'Число SQL-запросов по имени URL'),
+    'yatube_cache_hits_total': (
+        'counter', 'Попадания в кэш по имени URL'),
+    'yatube_cache_misses_total': (
+        'counter', 'Промахи кэша по имени URL'),
+    'yatube_cache_hit_ratio': (
+        'gauge', 'Доля попаданий в кэш с запуска процессов'),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+INITIAL_SIZE = 64 * 1024
+HEADER = struct.Struct('q')
+KEY_LENGTH = struct.Struct('i')
+VALUE = struct.Struct('d')
+
+
+def _entries(data, used):
+    '''Записи файла: (ключ, значение, смещение значения).'''
+    position = HEADER.size
+    while position < used:
+        length, = KEY_LENGTH.unpack_from(data, position)
+        key_end = position + KEY_LENGTH.size + length
+        key = bytes(data[position + KEY_LENGTH.size:key_end]).decode()
+        value_at = _aligned(key_end)
+        yield key, VALUE.unpack_from(data, value_at)[0], value_at
+        position = value_at + VALUE.size
+
+
+def _aligned(position):
+    return position + (-position % 8)
+
+
+class ProcessValues:
+    '''Значения одного процесса в файле. Файл — заголовок с занятой длиной
+    и записи «длина ключа, ключ, значение double». Новая запись сначала
+    пишется целиком и лишь потом учитывается в заголовке, так что читатель
+    в другом процессе никогда не видит её наполовину.'''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < INITIAL_SIZE:
+            self._file.truncate(INITIAL_SIZE)
+            size = INITIAL_SIZE
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used, = HEADER.unpack_from(self._map, 0)
+        if not self._used:
+            self._used = HEADER.size
+            HEADER.pack_into(self._map, 0, self._used)
+        self._positions = {
+            key: value_at
+            for key, _, value_at in _entries(self._map, self._used)}
+
+    def add(self, key, amount):
+        '''Вызывается под self.lock.'''
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        value, = VALUE.unpack_from(self._map, position)
+        VALUE.pack_into(self._map, position, value + amount)
+
+    def _append(self, key):
+        encoded = key.encode()
+        value_at = _aligned(self._used + KEY_LENGTH.size + len(encoded))
+        end = value_at + VALUE.size
+        if end > len(self._map):
+            self._grow(end)
+        KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        start = self._used + KEY_LENGTH.size
+        self._map[start:start + len(encoded)] = encoded
+        VALUE.pack_into(self._map, value_at, 0.0)
+        self._used = end
+        HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = value_at
+        return value_at
+
+    def _grow(self, needed):
+        size = len(self._map)
+        while size < needed:
+            size *= 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+
+_values = None
+_values_lock = threading.Lock()
+
+
+def _process_values():
+    '''Файл текущего процесса. После fork у потомка другой pid, и он
+    заводит свой файл, а не пишет в файл родителя.'''
+    global _values
+    path = os.path.join(settings.METRICS_DIR, f'metrics_{os.getpid()}.db')
+    values = _values
+    if values is not None and values.path == path:
+        return values
+    with _values_lock:
+        if _values is None or _values.path != path:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            _values = ProcessValues(path)
+        return _values
+
+
+def _key(name, **labels):
+    return json.dumps([name, sorted(labels.items())], ensure_ascii=False)
+
+
+def observe(view, status, duration, timings):
+    values = _process_values()
+    bucket = next(le for le in LATENCY_BUCKETS if duration <= le)
+    hits = timings.counts['cache_hits']
+    misses = timings.counts['cache_misses']
+    # Корзины хранятся непересекающимися, накопительными их делает
+    # экспорт: так запрос прибавляет одно число, а не десяток.
+    updates = [
+        (_key('yatube_request_duration_seconds_bucket', view=view,
+              le=_format(bucket)), 1),
+        (_key('yatube_request_duration_seconds_sum', view=view), duration),
+        (_key('yatube_request_duration_seconds_count', view=view), 1),
+        (_key('yatube_requests_total', view=view, status=str(status)), 1),
+        (_key('yatube_db_queries_total', view=view),
+         timings.counts['db_queries']),
+        (_key('yatube_cache_hits_total', view=view), hits),
+        (_key('yatube_cache_misses_total', view=view), misses),
+    ]
+    with values.lock:
+        for key, amount in updates:
+            values.add(key, amount)
+
+
+def collect():
+    '''Сумма значений всех файлов METRICS_DIR: {(имя, метки): значение}.'''
+    totals = defaultdict(float)
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+        with open(path, 'rb') as metrics_file:
+            data = metrics_file.read()
+        if len(data) < HEADER.size:
+            continue
+        used, = HEADER.unpack_from(data, 0)
+        for key, value, _ in _entries(data, min(used, len(data))):
+            name, labels = json.loads(key)
+            totals[name, tuple(tuple(label) for label in labels)] += value
+    return totals
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _sample(name, labels, value):
+    if labels:
+        pairs = ','.join(f'{label}="{_escape(str(label_value))}"'
+                         for label, label_value in labels)
+        name = f'{name}{{{pairs}}}'
+    return f'{name} {_format(value)}'
+
+
+def _histogram(totals):
+    '''Накопительные корзины, _sum и _count гистограммы задержки.'''
+    name = 'yatube_request_duration_seconds'
+    buckets = defaultdict(dict)
+    lines = []
+    for (sample, labels), value in totals.items():
+        labels = dict(labels)
+        if sample == f'{name}_bucket':
+            buckets[labels['view']][labels['le']] = value
+    for view in sorted(buckets):
+        cumulative = 0.0
+        for le in LATENCY_BUCKETS:
+            cumulative += buckets[view].get(_format(le), 0.0)
+            lines.append(_sample(f'{name}_bucket',
+                                 (('view', view), ('le', _format(le))),
+                                 cumulative))
+        for suffix in ('_sum', '_count'):
+            lines.append(_sample(
+                name + suffix, (('view', view),),
+                totals.get((name + suffix, (('view', view),)), 0.0)))
+    return lines
+
+
+def _hit_ratio(totals):
+    hits, misses = defaultdict(float), defaultdict(float)
+    for (sample, labels), value in totals.items():
+        if sample == 'yatube_cache_hits_total':
+            hits[labels] += value
+        elif sample == 'yatube_cache_misses_total':
+            misses[labels] += value
+    lines = []
+    for labels in sorted(hits):
+        total = hits[labels] + misses[labels]
+        if total:
+            lines.append(_sample('yatube_cache_hit_ratio', labels,
+                                 hits[labels] / total))
+    return lines
+
+
+def render(totals):
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            lines.extend(_histogram(totals))
+        elif kind == 'gauge':
+            lines.extend(_hit_ratio(totals))
+        else:
+            lines.extend(_sample(sample, labels, value)
+                         for (sample, labels), value in sorted(totals.items())
+                         if sample == name)
+    return '\n'.join(lines) + '\n'
+
+
+def _authorized(request):
+    token = settings.METRICS_TOKEN
+    scheme, _, credentials = request.META.get(
+        'HTTP_AUTHORIZATION', '').partition(' ')
+    if not token or scheme.lower() != 'bearer':
+        return False
+    return hmac.compare_digest(credentials.encode(), token.encode())
+
+
+def metrics(request):
+    '''Метрики всех процессов; отдаются только с токеном METRICS_TOKEN в
+    заголовке Authorization: Bearer.'''
+    if not _authorized(request):
+        raise Http404
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with timing.measure(request, timed=False) as timings:
+            response = self.get_response(request)
+        observe(timing.view_name(request), response.status_code,
+                time.perf_counter() - started, timings)
+        return response
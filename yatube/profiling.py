@@ -0,0 +1,124 @@
+'''Профилирование медленных запросов семплированием стека.
+
+ProfilingMiddleware профилирует долю запросов PROFILE_SAMPLE_RATE, а также
+любой запрос с подписанным параметром ?_profile= (его выдаёт команда
+profile_trigger). Отдельный поток раз в PROFILE_INTERVAL секунд снимает
+стек потока, обрабатывающего запрос, поэтому сам запрос не замедляется
+трассировкой каждого вызова. Профили запросов дольше PROFILE_SLOW_THRESHOLD
+секунд, а также всех запросов по триггеру, пишутся в PROFILE_DIR; команда
+collapse_profiles сводит их в файл свёрнутых стеков для flamegraph.
+'''
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+from . import timing
+
+TRIGGER_PARAMETER = '_profile'
+TRIGGER_SALT = 'yatube.profiling'
+
+
+def trigger_token(path):
+    '''Подписанное значение ?_profile= для запросов к path.'''
+    return signing.dumps(path, salt=TRIGGER_SALT)
+
+
+def _triggered(request):
+    token = request.GET.get(TRIGGER_PARAMETER)
+    if not token:
+        return False
+    try:
+        path = signing.loads(token, salt=TRIGGER_SALT,
+                             max_age=settings.PROFILE_TRIGGER_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return path == request.path
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}.{getattr(code, "co_qualname", code.co_name)}'
+
+
+class Sampler:
+    '''Снимает стек потока thread_id, пока не вызван stop(). Стек
+    обрезается на кадре root, чтобы в профиль не попадал сам WSGI-сервер.
+    '''
+
+    def __init__(self, thread_id, root, interval):
+        self.thread_id = thread_id
+        self.root = root
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None and frame.f_code is not self.root:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+
+def _dump(request, view, duration, sampler, triggered):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    name = f'{time.time():.6f}-{os.getpid()}-{view}.json'
+    data = {
+        'path': request.path,
+        'view': view,
+        'duration': duration,
+        'interval': sampler.interval,
+        'triggered': triggered,
+        'stacks': sampler.stacks,
+    }
+    # Через временный файл, чтобы collapse_profiles не прочла дамп
+    # наполовину.
+    descriptor, temporary = tempfile.mkstemp(dir=settings.PROFILE_DIR,
+                                             suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as dump:
+        json.dump(data, dump, ensure_ascii=False)
+    os.replace(temporary, os.path.join(settings.PROFILE_DIR, name))
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        triggered = _triggered(request)
+        if not triggered and (
+                random.random() >= settings.PROFILE_SAMPLE_RATE):
+            return self.get_response(request)
+        sampler = Sampler(threading.get_ident(), self.__call__.__code__,
+                          settings.PROFILE_INTERVAL)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        duration = time.perf_counter() - started
+        if triggered or duration >= settings.PROFILE_SLOW_THRESHOLD:
+            _dump(request, timing.view_name(request), duration, sampler,
+                  triggered)
+        return response
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -50,6 +51,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.profiling.ProfilingMiddleware',
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,7 +68,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yatube.timing.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,6 +93,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Счётчики и ленты обновляются сигналами в той же транзакции,
+        # что и сама запись.
+        'ATOMIC_REQUESTS': True,
     }
 }
 
@@ -156,3 +163,76 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# Автор, набравший FEED_PULL_THRESHOLD подписчиков, перестаёт раскладывать
+# посты по лентам подписчиков: они подмешиваются в ленту при чтении. Назад
+# он переходит, только опустившись ниже FEED_PUSH_THRESHOLD, и тогда в
+# ленты раскладываются его последние FEED_BACKFILL_POSTS постов; столько же
+# получает и новый подписчик push-автора. Более старых постов такого
+# автора в ленте подписок нет, пока их не разложит команда
+# rebuild_timelines; её же стоит запускать после изменения порогов.
+FEED_PULL_THRESHOLD = 1000
+FEED_PUSH_THRESHOLD = 800
+FEED_BACKFILL_POSTS = 100
+
+# Миниатюры картинок строятся в фоне после сохранения поста; 0 — строить
+# их синхронно в том же процессе.
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+THUMBNAIL_ENGINE = 'posts.thumbnail_engine.Engine'
+
+# Доля запросов, для которых middleware yatube.timing засекает время SQL,
+# шаблонов и миниатюр, проверяет медленные запросы (SLOW_QUERY_THRESHOLD) и
+# отдаёт замер в заголовке Server-Timing. Метрики /metrics/ считают число
+# SQL-запросов и обращения к кэшу на всех запросах, но без засечек времени.
+SERVER_TIMING_SAMPLE_RATE = 1.0 if DEBUG else 0.01
+
+# Каталог, куда каждый процесс пишет свои метрики, и токен, с которым
+# /metrics/ их отдаёт (заголовок Authorization: Bearer <токен>). Адрес
+# клиента не проверяется: за обратным прокси он всегда 127.0.0.1. Без
+# токена /metrics/ выключен. Каталог стоит очищать при каждой выкладке.
+METRICS_DIR = os.environ.get(
+    'YATUBE_METRICS_DIR',
+    os.path.join(tempfile.gettempdir(), 'yatube-metrics'))
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+
+# Профилирование yatube.profiling: доля профилируемых запросов, частота
+# снимков стека в секундах, порог, после которого профиль сохраняется, и
+# срок жизни подписанного параметра ?_profile=.
+PROFILE_SAMPLE_RATE = 0.001
+PROFILE_INTERVAL = 0.005
+PROFILE_SLOW_THRESHOLD = 0.5
+PROFILE_TRIGGER_MAX_AGE = 60 * 60
+PROFILE_DIR = os.environ.get(
+    'YATUBE_PROFILE_DIR',
+    os.path.join(tempfile.gettempdir(), 'yatube-profiles'))
+
+# SQL-запросы дольше порога (в секундах) пишутся с планом в журнал
+# yatube.slow_queries; отчёт по нему строит команда slow_query_report.
+# Просмотр индекса целиком по таблицам лент отчёт тоже считает проблемой.
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_FEED_TABLES = ['posts_post', 'posts_timelineentry']
+# Журнал лежит рядом с проектом, а не в общем для всех пользователей /tmp.
+SLOW_QUERY_LOG = os.environ.get(
+    'YATUBE_SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'slow_queries.log'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'slow_queries': {
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'yatube.timing': {'handlers': ['console'], 'level': 'INFO'},
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
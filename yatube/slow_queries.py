@@ -0,0 +1,123 @@
+'''Журнал медленных SQL-запросов.
+
+Запрос дольше SLOW_QUERY_THRESHOLD секунд пишется JSON-строкой в лог
+yatube.slow_queries вместе с планом EXPLAIN QUERY PLAN, представлением и
+шаблоном, из которых он пришёл. В журнал попадает только форма запроса:
+параметры (данные сессий, адреса, хеши паролей) и литералы из него
+выброшены. Команда slow_query_report группирует
+журнал по форме запроса. Проверяются запросы внутри замера со временем
+yatube.timing.measure(timed=True), то есть запросы той доли HTTP-запросов
+SERVER_TIMING_SAMPLE_RATE, которую замеряет ServerTimingMiddleware.
+'''
+import json
+import logging
+import re
+import sys
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+_RENDER_CODE = Template.render.__code__
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_SPACE = re.compile(r'\s+')
+_BOUNDED = re.compile(r'\bLIMIT\b|^SELECT COUNT\(\*\)', re.IGNORECASE)
+_WHERE = re.compile(r'\bWHERE\b', re.IGNORECASE)
+_RANGE = re.compile(r'[<>]')
+_FROM = re.compile(r'\bFROM\s+"?(\w+)', re.IGNORECASE)
+
+
+def normalize(sql):
+    '''Форма запроса: литералы и списки параметров IN (...) свёрнуты,
+    чтобы запросы, различающиеся только значениями, совпадали.'''
+    shape = _STRING.sub('%s', sql)
+    shape = _NUMBER.sub('%s', shape)
+    shape = _PLACEHOLDER_LIST.sub('(...)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+def explain(connection, sql, params):
+    '''План запроса на SQLite — строки detail из EXPLAIN QUERY PLAN.
+
+    Курсор берётся в обход обёрток execute_wrapper, чтобы сам EXPLAIN не
+    считался запросом и не попадал в журнал.'''
+    if connection.vendor != 'sqlite':
+        return None
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params or ())
+        return [row[3] for row in cursor.fetchall()]
+    except DatabaseError:
+        return None
+    finally:
+        cursor.close()
+
+
+def _feed_table(detail):
+    words = detail.split()
+    return len(words) > 1 and words[1] in settings.SLOW_QUERY_FEED_TABLES
+
+
+def _unbounded(detail, sql):
+    '''Шаг по таблице ленты, который просматривает индекс от начала, так
+    что время растёт с глубиной страницы: SCAN ... USING INDEX или SEARCH
+    по основной таблице запроса без диапазона, хотя запрос фильтрует по
+    сравнению (курсор страницы).
+
+    Просмотр индекса оправдан только запросом без фильтра: страницей всей
+    ленты с LIMIT или COUNT(*) для Paginator, который кэширует
+    posts.cache.CachedCount.'''
+    if not _feed_table(detail):
+        return False
+    if detail.startswith('SCAN '):
+        return (sql is None or _WHERE.search(sql) is not None
+                or not _BOUNDED.search(sql))
+    if sql is None or not detail.startswith('SEARCH '):
+        return False
+    source = _FROM.search(sql)
+    where = _WHERE.split(sql, 1)
+    return (source is not None and detail.split()[1] == source.group(1)
+            and len(where) > 1 and _RANGE.search(where[1]) is not None
+            and not _RANGE.search(detail))
+
+
+def plan_problems(plan, sql=None):
+    '''Шаги плана, которые обычно означают недостающий индекс: полный
+    просмотр таблицы, сортировка во временном B-дереве и просмотр индекса
+    таблицы ленты от начала (см. _unbounded). SCAN CONSTANT ROW — выборка
+    без таблицы, например INSERT ... SELECT из значений.'''
+    problems = []
+    for detail in plan or ():
+        if detail == 'SCAN CONSTANT ROW':
+            continue
+        if ('TEMP B-TREE' in detail
+                or (detail.startswith('SCAN ') and 'USING' not in detail)
+                or _unbounded(detail, sql)):
+            problems.append(detail)
+    return problems
+
+
+def _template_name():
+    '''Самый внутренний шаблон, который сейчас рендерится.'''
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code is _RENDER_CODE:
+            return frame.f_locals['self'].name
+        frame = frame.f_back
+    return None
+
+
+def log_query(connection, sql, params, many, duration, view):
+    plan = None if many else explain(connection, sql, params)
+    logger.warning(json.dumps({
+        'duration_ms': round(duration * 1000, 1),
+        'shape': normalize(sql),
+        'plan': plan,
+        'view': view,
+        'template': _template_name(),
+    }, ensure_ascii=False))
@@ -0,0 +1,199 @@
+'''Замеры отдельных запросов: число и время SQL, рендеринг шаблонов,
+кэш и миниатюры.
+
+Замер открывает measure(): вне него timer() и incr() сразу возвращаются,
+поэтому точки замера в коде почти ничего не стоят. Метрики yatube.metrics
+открывают на каждом запросе дешёвый замер без времени: он только считает
+SQL-запросы и обращения к кэшу. ServerTimingMiddleware включает в нём
+время (timed=True) для доли запросов SERVER_TIMING_SAMPLE_RATE: только у
+них засекается время SQL, шаблонов и миниатюр и проверяются медленные
+запросы, а результат уходит в заголовок Server-Timing и одной
+JSON-строкой в лог yatube.timing.
+'''
+import json
+import logging
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates as BaseBackend
+from django.template.backends.django import Template as BaseTemplate
+from django.template.backends.django import reraise
+
+from . import slow_queries
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self, request=None, timed=True):
+        self.request = request
+        self.timed = timed
+        self.durations = defaultdict(float)
+        self.counts = Counter()
+        self.active = set()
+
+
+def incr(name, amount=1):
+    timings = _current.get()
+    if timings is not None:
+        timings.counts[name] += amount
+
+
+@contextmanager
+def timer(name):
+    '''Добавляет время блока к замеру name. Вложенные блоки с тем же
+    именем не считаются дважды.'''
+    timings = _current.get()
+    if timings is None or not timings.timed or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[name] += time.perf_counter() - started
+        timings.active.discard(name)
+
+
+def timed(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def view_name(request):
+    '''Имя URL запроса; у безымянных маршрутов — путь к функции.'''
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.url_name or match.view_name
+
+
+def _query_counter(execute, sql, params, many, context):
+    incr('db_queries')
+    return execute(sql, params, many, context)
+
+
+def _query_timer(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        with timer('db'):
+            return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        if duration >= settings.SLOW_QUERY_THRESHOLD:
+            request = _current.get().request
+            slow_queries.log_query(
+                context['connection'], sql, params, many, duration,
+                view_name(request) if request is not None else None)
+
+
+def _wrap_queries(stack, wrapper):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+
+
+@contextmanager
+def measure(request=None, timed=True):
+    '''Замеряет блок и отдаёт RequestTimings. Без timed только считает
+    SQL-запросы и incr(). Если замер уже идёт, блок входит в него, а не
+    начинает новый; timed=True включает в нём время до конца блока.'''
+    timings = _current.get()
+    if timings is not None:
+        timings.request = timings.request or request
+        if not timed or timings.timed:
+            yield timings
+            return
+        timings.timed = True
+        try:
+            with ExitStack() as stack:
+                _wrap_queries(stack, _query_timer)
+                yield timings
+        finally:
+            timings.timed = False
+        return
+    timings = RequestTimings(request, timed)
+    token = _current.set(timings)
+    try:
+        with ExitStack() as stack:
+            _wrap_queries(stack, _query_counter)
+            if timed:
+                _wrap_queries(stack, _query_timer)
+            yield timings
+    finally:
+        _current.reset(token)
+
+
+def _header(timings, total):
+    hits, misses = timings.counts['cache_hits'], timings.counts['cache_misses']
+    metrics = [
+        f'db;dur={timings.durations["db"] * 1000:.1f};'
+        f'desc="{timings.counts["db_queries"]} queries"',
+        f'tpl;dur={timings.durations["template"] * 1000:.1f}',
+        f'thumb;dur={timings.durations["thumbnails"] * 1000:.1f}',
+        f'cache;desc="{hits} hits, {misses} misses"',
+        f'total;dur={total * 1000:.1f}',
+    ]
+    return ', '.join(metrics)
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+        started = time.perf_counter()
+        with measure(request) as timings:
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        response['Server-Timing'] = _header(timings, total)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view_name(request),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_queries': timings.counts['db_queries'],
+            'db_ms': round(timings.durations['db'] * 1000, 1),
+            'template_ms': round(timings.durations['template'] * 1000, 1),
+            'thumbnails_ms': round(timings.durations['thumbnails'] * 1000,
+                                   1),
+            'cache_hits': timings.counts['cache_hits'],
+            'cache_misses': timings.counts['cache_misses'],
+        }, ensure_ascii=False))
+        return response
+
+
+class Template(BaseTemplate):
+    def render(self, context=None, request=None):
+        with timer('template'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(BaseBackend):
+    '''Шаблонный бэкенд Django, который замеряет время рендеринга.'''
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
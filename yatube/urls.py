@@ -5,6 +5,8 @@ from django.conf.urls import handler404, handler500
 from django.conf import settings
 from django.conf.urls.static import static
 
+from yatube import metrics
+
 
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
@@ -17,6 +19,7 @@ urlpatterns = [
          {"url": "/about-spec/"}, name="about-spec"),
     path("about/contacts/", views.flatpage, {"url": "/contacts/"},
          name="contacts"),
+    path("metrics/", metrics.metrics, name="metrics"),
     path("", include("posts.urls")),
     path("about/", include("django.contrib.flatpages.urls")),
     path("auth/", include("users.urls")),